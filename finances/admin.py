@@ -1,36 +1,76 @@
 from django.contrib import admin
+from django.contrib.admin.forms import AdminAuthenticationForm
+from django.core.exceptions import ValidationError
+
+from .hashing import HashingBusy
 from .models import Category, Item, Budget, ToBuy
+from .pagination import EstimatedCountPaginator
+from .search import matching
+
+
+class PooledAdminAuthenticationForm(AdminAuthenticationForm):
+    """Admin login form reporting a saturated hashing pool as a form error rather than a 500."""
+
+    def clean(self):
+        try:
+            return super().clean()
+        except HashingBusy as exc:
+            raise ValidationError(str(exc.default_detail), code='hashing_busy')
+
+
+admin.site.login_form = PooledAdminAuthenticationForm
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Changelist of a large per-user table: search goes through the full-text
+    index instead of LIKE '%term%' scans, the category is joined rather than
+    fetched per row, and pages are counted from table statistics when
+    nothing narrows the list. Dates are narrowed with the created_at list
+    filter; a date_hierarchy would scan every row for its distinct dates.
+    """
+    list_select_related = ['category']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return matching(queryset, search_term), False
+
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ['name', 'created_at', 'get_total_amount', 'get_items_count']
     search_fields = ['name']
-    
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # Totals and counts from the balance ledger, in the same query as the rows
+        return super().get_queryset(request).with_totals()
+
+    @admin.display(description='Total Amount', ordering='total_amount')
     def get_total_amount(self, obj):
         return f"{obj.total_amount:,.2f} UGX"
-    get_total_amount.short_description = 'Total Amount'
-    
+
+    @admin.display(description='Items Count', ordering='items_count')
     def get_items_count(self, obj):
-        return obj.itemsItem.count()
-    get_items_count.short_description = 'Items Count'
+        return obj.items_count
 
 @admin.register(Item)
-class ItemAdmin(admin.ModelAdmin):
+class ItemAdmin(LargeTableAdmin):
     list_display = ['name', 'category', 'amount', 'created_at']
     list_filter = ['category', 'created_at']
     search_fields = ['name', 'description']
-    date_hierarchy = 'created_at'
 
 @admin.register(Budget)
-class BudgetAdmin(admin.ModelAdmin):
+class BudgetAdmin(LargeTableAdmin):
     list_display = ['name', 'category', 'amount','type', 'created_at']
     list_filter = ['category', 'created_at']
     search_fields = ['name', 'description']
-    date_hierarchy = 'created_at'
 
 @admin.register(ToBuy)
-class ToBuyAdmin(admin.ModelAdmin):
+class ToBuyAdmin(LargeTableAdmin):
     list_display = ['name', 'category', 'created_at']
     list_filter = ['category', 'created_at']
     search_fields = ['name', 'description']
-    date_hierarchy = 'created_at'
\ No newline at end of file
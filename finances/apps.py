@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class FinancesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'finances'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .search import restore_triggers
+
+        post_migrate.connect(restore_triggers, sender=self)
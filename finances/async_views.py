@@ -0,0 +1,122 @@
+# Async versions of the read-heavy API endpoints. They return the same JSON as
+# their DRF counterparts; under an ASGI server (uvicorn, daphne) concurrent
+# requests share one worker instead of each holding a sync worker.
+from decimal import Decimal
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum
+from django.http import HttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from rest_framework.views import APIView
+
+from .authentication import full_user
+from .filters import ITEM_TOTALS
+from .mixins import total_aggregates, totals_block
+from .models import Category, CategoryBalance, Item
+from .renderers import FastJSONRenderer
+from .serializers import CategoryListSerializer, ItemSerializer, UserSerializer
+from .summary import cache_key, cached_summary
+
+
+def json_response(data, status=200):
+    return HttpResponse(FastJSONRenderer().render(data), status=status, content_type='application/json')
+
+
+async def authenticate(request):
+    """
+    The user of `request` by the same authentication classes as the sync
+    endpoints (DEFAULT_AUTHENTICATION_CLASSES), revocation checks included.
+    """
+    for authenticator_class in APIView.authentication_classes:
+        result = await sync_to_async(authenticator_class().authenticate)(request)
+        if result is not None:
+            return result[0]
+    return None
+
+
+def async_api(login_required=False):
+    """GET-only async endpoint with DRF-style authentication errors."""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return json_response({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+            try:
+                user = await authenticate(request)
+            except AuthenticationFailed as exc:
+                return json_response({'detail': exc.detail}, status=401)
+            if login_required and user is None:
+                return json_response({'detail': 'Authentication credentials were not provided.'}, status=401)
+            request.user = user
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+async def paginate(request, queryset, serializer_class, totals=None):
+    """Same envelope as DRF's PageNumberPagination, plus ConditionalListMixin's `totals` aggregates."""
+    page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+    try:
+        page = int(request.GET.get('page', 1))
+    except ValueError:
+        page = 0
+    if totals:
+        aggregates = await queryset.order_by().aaggregate(count=Count('pk'), **total_aggregates(totals))
+        count = aggregates['count']
+    else:
+        count = await queryset.acount()
+    last_page = max(1, -(-count // page_size))
+    if not 1 <= page <= last_page:
+        return json_response({'detail': 'Invalid page.'}, status=404)
+
+    start = (page - 1) * page_size
+    rows = [row async for row in queryset[start:start + page_size]]
+    url = request.build_absolute_uri()
+    previous = None
+    if page > 1:
+        previous = remove_query_param(url, 'page') if page == 2 else replace_query_param(url, 'page', page - 1)
+    data = {
+        'count': count,
+        'next': replace_query_param(url, 'page', page + 1) if page < last_page else None,
+        'previous': previous,
+        'results': serializer_class(rows, many=True).data,
+    }
+    if totals:
+        data['totals'] = totals_block(count, aggregates)
+    return json_response(data)
+
+
+@async_api()
+async def category_list(request):
+    return await paginate(request, Category.objects.with_totals(), CategoryListSerializer)
+
+
+@async_api()
+async def total_assets(request):
+    total = (await CategoryBalance.objects.aaggregate(total=Sum('balance')))['total'] or Decimal('0.00')
+    return json_response({'total_assets': total.quantize(Decimal('0.01'))})
+
+
+@async_api(login_required=True)
+async def item_list(request):
+    items = Item.objects.filter(user=request.user).select_related('category', 'user')
+    return await paginate(request, items, ItemSerializer, ITEM_TOTALS)
+
+
+@async_api(login_required=True)
+async def profile(request):
+    user = await sync_to_async(full_user)(request.user)
+    return json_response(UserSerializer(user).data)
+
+
+@async_api(login_required=True)
+async def summary(request):
+    entry = await cache.aget(cache_key(request.user.pk))
+    if entry is None:
+        # Rebuilt at most once per invalidation
+        entry = await sync_to_async(cached_summary)(request.user)
+    return json_response(entry[1])
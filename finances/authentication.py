@@ -0,0 +1,171 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import hashing
+
+# User fields copied into tokens; changing one revokes the user's tokens
+CLAIM_FIELDS = ('username', 'is_staff', 'is_superuser')
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """Refresh token carrying CLAIM_FIELDS, which its access tokens inherit."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for field in CLAIM_FIELDS:
+            token[field] = getattr(user, field)
+        return token
+
+
+def revoked_key(user_id):
+    return f'finances:revoked:{user_id}'
+
+
+def revoke_tokens(user_id):
+    """Reject every token of `user_id` issued before now, for as long as such a token could live."""
+    lifetime = max(jwt_settings.ACCESS_TOKEN_LIFETIME, jwt_settings.REFRESH_TOKEN_LIFETIME)
+    # iat has whole seconds, so tokens issued in the same second are revoked too
+    cache.set(revoked_key(user_id), time.time(), int(lifetime.total_seconds()))
+
+
+def is_revoked(token):
+    revoked_at = cache.get(revoked_key(token[jwt_settings.USER_ID_CLAIM]))
+    return revoked_at is not None and token.get('iat', 0) < revoked_at
+
+
+class UserCache:
+    """Small per-process LRU of full User rows, each kept at most `ttl` seconds."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.users = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.users.get(user_id)
+            if entry is not None and entry[1] > now:
+                self.users.move_to_end(user_id)
+                return entry[0]
+        user = User.objects.get(pk=user_id)
+        with self.lock:
+            self.users[user_id] = (user, now + self.ttl)
+            self.users.move_to_end(user_id)
+            while len(self.users) > self.maxsize:
+                self.users.popitem(last=False)
+        return user
+
+    def forget(self, user_id):
+        with self.lock:
+            self.users.pop(user_id, None)
+
+
+user_cache = UserCache(settings.AUTH_USER_CACHE_SIZE, settings.AUTH_USER_CACHE_TIMEOUT)
+
+
+def full_user(user):
+    """The complete User row behind `request.user`, from the LRU when it was built from claims."""
+    if getattr(user, 'from_claims', False):
+        return user_cache.get(user.pk)
+    return user
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication without the per-request User query. The user is built
+    from the token's claims (see ClaimsRefreshToken): a User instance holding
+    just id, username and flags, enough for ownership filters and foreign
+    keys. Views that need other fields go through full_user(). Tokens of
+    deactivated users, or whose claims or password changed, are rejected
+    through the revocation keys in the cache, so the cache must be shared
+    by every server process: a local-memory cache is refused.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if isinstance(caches['default'], LocMemCache):
+            raise ImproperlyConfigured(
+                'StatelessJWTAuthentication keeps token revocations in the cache; '
+                'set CACHE_BACKEND to a cache shared by every server process.'
+            )
+
+    def get_user(self, validated_token):
+        try:
+            # The claim holds the id as a string
+            user_id = User._meta.pk.to_python(validated_token[jwt_settings.USER_ID_CLAIM])
+        except (KeyError, ValidationError):
+            raise InvalidToken('Token contained no recognizable user identification')
+        if is_revoked(validated_token):
+            raise AuthenticationFailed('Token has been revoked', code='token_revoked')
+        if not all(field in validated_token for field in CLAIM_FIELDS):
+            # Issued before claims were added
+            try:
+                user = user_cache.get(user_id)
+            except User.DoesNotExist:
+                raise AuthenticationFailed('User not found', code='user_not_found')
+            if not user.is_active:
+                raise AuthenticationFailed('User is inactive', code='user_inactive')
+            return user
+
+        user = User(pk=user_id, is_active=True, **{field: validated_token[field] for field in CLAIM_FIELDS})
+        user._state.adding = False
+        user._state.db = DEFAULT_DB_ALIAS
+        user.from_claims = True
+        return user
+
+
+class RevocationAwareRefreshSerializer(TokenRefreshSerializer):
+    """Stops revoked refresh tokens from minting fresh access tokens."""
+
+    def validate(self, attrs):
+        if is_revoked(self.token_class(attrs['refresh'])):
+            raise InvalidToken('Token has been revoked')
+        return super().validate(attrs)
+
+
+class PooledModelBackend(ModelBackend):
+    """
+    ModelBackend verifying passwords in the hashing pool (see hashing.py),
+    so a login storm can't take the request workers' CPU. Raises
+    hashing.HashingBusy when the pool is saturated.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = User._default_manager.get_by_natural_key(username)
+        except User.DoesNotExist:
+            # Hash anyway so unknown usernames take as long as wrong passwords
+            hashing.make_password(password)
+            return None
+        valid, upgraded = hashing.check_password(password, user.password)
+        if valid and upgraded:
+            # Same password, new hash: an update() keeps save()'s signals from
+            # revoking the tokens this login is about to hand out
+            user.password = upgraded
+            User._default_manager.filter(pk=user.pk).update(password=upgraded)
+            user_cache.forget(user.pk)
+        if valid and self.user_can_authenticate(user):
+            return user
+        return None
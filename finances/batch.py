@@ -0,0 +1,128 @@
+import io
+import json
+import logging
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import transaction
+from django.urls import Resolver404, resolve
+
+from .transactions import write_transaction
+
+logger = logging.getLogger(__name__)
+
+METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+
+# Response headers worth handing back, e.g. for conditional polls
+RESPONSE_HEADERS = ('ETag', 'Last-Modified', 'Location')
+
+# Routes that can't run inside a batch: the batch itself, and login, which
+# starts a session the synthetic sub-request doesn't have
+UNBATCHABLE = ('batch', 'login')
+
+
+def _batchable(match):
+    # Only synchronous DRF views; the async endpoints return coroutines and
+    # plain Django views skip the forced authentication
+    return (match.url_name not in UNBATCHABLE and match.route.startswith('api/')
+            and hasattr(match.func, 'cls'))
+
+
+def validate(entries):
+    """Error message for a malformed list of sub-requests, or None."""
+    if not isinstance(entries, list) or not entries:
+        return "'requests' must be a non-empty list"
+    if len(entries) > settings.BATCH_MAX_REQUESTS:
+        return f'At most {settings.BATCH_MAX_REQUESTS} requests per batch'
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            return f'Request {index} must be an object'
+        if str(entry.get('method', 'GET')).upper() not in METHODS:
+            return f'Request {index} has an unsupported method'
+        if not isinstance(entry.get('path'), str) or not entry['path'].startswith('/api/'):
+            return f"Request {index} needs a 'path' under /api/"
+        if not isinstance(entry.get('headers', {}), dict):
+            return f"Request {index} has malformed 'headers'"
+        try:
+            match = resolve(entry['path'].partition('?')[0])
+        except Resolver404:
+            # Answered 404 in its place
+            continue
+        if not _batchable(match):
+            return f'Request {index} cannot be batched'
+    return None
+
+
+def _sub_request(request, entry):
+    path, _, query = entry['path'].partition('?')
+    body = entry.get('body')
+    payload = b'' if body is None else json.dumps(body).encode()
+    environ = {
+        # Outer request headers other than the batch's own body and preconditions
+        key: value for key, value in request.META.items()
+        if not key.startswith(('HTTP_IF_', 'CONTENT_', 'wsgi.'))
+    }
+    environ.update({
+        'REQUEST_METHOD': str(entry.get('method', 'GET')).upper(),
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(payload)),
+        'wsgi.input': io.BytesIO(payload),
+    })
+    for name, value in entry.get('headers', {}).items():
+        environ['HTTP_' + name.upper().replace('-', '_')] = str(value)
+    sub = WSGIRequest(environ)
+    if request.user.is_authenticated:
+        # Authenticated once for the whole batch; DRF takes these instead of re-authenticating
+        sub._force_auth_user = request.user
+        sub._force_auth_token = request.auth
+    return sub
+
+
+def _call(request, entry):
+    sub = _sub_request(request, entry)
+    try:
+        match = resolve(sub.path_info)
+    except Resolver404:
+        return {'status': 404, 'headers': {}, 'body': {'detail': 'Not found.'}}
+
+    try:
+        response = match.func(sub, *match.args, **match.kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        if response.get('Content-Type', '').startswith('application/json') and content:
+            body = json.loads(content)
+        else:
+            body = content.decode() or None
+    except Exception:
+        # Reported like any other failed sub-request rather than failing the batch
+        logger.exception('Batched %s %s failed', sub.method, sub.path)
+        return {'status': 500, 'headers': {}, 'body': {'detail': 'Server error.'}}
+    headers = {name: response[name] for name in RESPONSE_HEADERS if response.has_header(name)}
+    return {'status': response.status_code, 'headers': headers, 'body': body}
+
+
+def run_batch(request, entries, atomic=False):
+    """
+    Run `entries` in order through the API's own views, authenticated as
+    `request`'s user, and return one {'status', 'headers', 'body'} per entry.
+
+    With `atomic`, the batch is one write transaction: the first sub-request
+    answering 400 or above rolls back everything before it and the rest are
+    not run (their status is null).
+    """
+    if not atomic:
+        return [_call(request, entry) for entry in entries]
+
+    results = []
+    with write_transaction():
+        for entry in entries:
+            result = _call(request, entry)
+            results.append(result)
+            if result['status'] >= 400:
+                transaction.set_rollback(True)
+                break
+    results.extend({'status': None, 'headers': {}, 'body': None} for _ in entries[len(results):])
+    return results
@@ -0,0 +1,95 @@
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from .models import Budget, Item, ToBuy
+
+CHUNK_SIZE = 2000
+
+COLUMNS = [
+    'kind', 'id', 'name', 'category', 'category_name', 'amount', 'current_balance',
+    'type', 'description', 'created_at', 'updated_at',
+]
+
+# kind -> (model, columns read for it); columns missing for a kind are left empty
+SOURCES = [
+    ('item', Item, ['id', 'name', 'category_id', 'category__name', 'amount', 'current_balance',
+                    'description', 'created_at', 'updated_at']),
+    ('budget', Budget, ['id', 'name', 'category_id', 'category__name', 'amount', 'type',
+                        'description', 'created_at', 'updated_at']),
+    ('to-buy', ToBuy, ['id', 'name', 'category_id', 'category__name', 'amount',
+                       'description', 'created_at', 'updated_at']),
+]
+
+_OUTPUT_NAMES = {'category_id': 'category', 'category__name': 'category_name'}
+
+
+def ledger_rows(user, date_from=None, date_to=None, category=None):
+    """
+    Yield every item, budget and to-buy of `user` as a dict keyed by COLUMNS.
+
+    Rows are read as tuples in chunks, so memory use does not depend on the
+    size of the account.
+    """
+    filters = {'user': user}
+    # Datetime bounds rather than created_at__date, which hides the column
+    # from the (user, created_at) indexes behind DATE()
+    if date_from:
+        filters['created_at__gte'] = timezone.make_aware(datetime.combine(date_from, time.min))
+    if date_to:
+        filters['created_at__lt'] = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min))
+    if category:
+        filters['category_id'] = category
+
+    for kind, model, fields in SOURCES:
+        names = ['kind'] + [_OUTPUT_NAMES.get(field, field) for field in fields]
+        queryset = (
+            model.objects.filter(**filters)
+            .order_by('created_at', 'id')
+            .values_list(*fields)
+            .iterator(chunk_size=CHUNK_SIZE)
+        )
+        for values in queryset:
+            yield dict(zip(names, (kind,) + values))
+
+
+class _Echo:
+    """File-like object whose write() hands the line back, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def stream_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        yield writer.writerow([_text(row.get(column)) for column in COLUMNS])
+
+
+def _json_value(value):
+    # Ids stay numbers; Decimals and datetimes are written as strings, as the API does
+    if value is None or isinstance(value, int):
+        return value
+    return _text(value)
+
+
+def stream_ndjson(rows):
+    for row in rows:
+        yield json.dumps({key: _json_value(value) for key, value in row.items()}) + '\n'
+
+
+FORMATS = {
+    'csv': (stream_csv, 'text/csv'),
+    'ndjson': (stream_ndjson, 'application/x-ndjson'),
+}
@@ -0,0 +1,101 @@
+from datetime import datetime, time
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import F, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+
+# Aggregates the item list reports as `totals`, over every item matching its filters
+ITEM_TOTALS = {
+    'amount': Sum('amount', default=Decimal('0.00')),
+    'current_balance': Sum('current_balance', default=Decimal('0.00')),
+    'spent': Sum(F('amount') - F('current_balance'), default=Decimal('0.00')),
+}
+
+
+def _moment(value, end_of_day=False):
+    """An aware datetime from an ISO date or datetime; a bare date covers the whole day."""
+    moment = parse_datetime(value)
+    if moment is None and parse_date(value) is not None:
+        moment = datetime.combine(parse_date(value), time.max if end_of_day else time.min)
+    if moment is not None and timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def _amount(value):
+    try:
+        amount = Decimal(value)
+    except InvalidOperation:
+        return None
+    return amount if amount.is_finite() else None
+
+
+class ItemFilter(BaseFilterBackend):
+    """
+    Narrow the item list with query parameters, all optional:
+
+        ?category=<id>
+        ?created_after=<ISO date or datetime>&created_before=<...>
+        ?min_amount=<decimal>&max_amount=<decimal>
+        ?has_balance=true|false
+
+    Dates are inclusive. Category and date bounds are read off the
+    (user, category, created_at) index; a malformed value answers 400.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        errors = {}
+        filters = {}
+
+        category = params.get('category')
+        if category:
+            # isdigit() alone also passes digits int() rejects, such as '²'
+            if category.isascii() and category.isdigit():
+                filters['category_id'] = int(category)
+            else:
+                errors['category'] = 'must be a category id'
+
+        for param, lookup, end_of_day in (
+            ('created_after', 'created_at__gte', False),
+            ('created_before', 'created_at__lte', True),
+        ):
+            value = params.get(param)
+            if value:
+                filters[lookup] = _moment(value, end_of_day)
+                if filters[lookup] is None:
+                    errors[param] = 'must be an ISO date or datetime'
+
+        for param, lookup in (('min_amount', 'amount__gte'), ('max_amount', 'amount__lte')):
+            value = params.get(param)
+            if value:
+                filters[lookup] = _amount(value)
+                if filters[lookup] is None:
+                    errors[param] = 'must be a decimal amount'
+
+        has_balance = params.get('has_balance')
+        if has_balance:
+            if has_balance.lower() in ('true', '1'):
+                filters['current_balance__gt'] = 0
+            elif has_balance.lower() in ('false', '0'):
+                filters['current_balance__lte'] = 0
+            else:
+                errors['has_balance'] = 'must be true or false'
+
+        if errors:
+            raise ValidationError(errors)
+        return queryset.filter(**filters)
+
+
+class StableOrderingFilter(OrderingFilter):
+    """OrderingFilter that breaks ties by id, so pages don't overlap between equal values."""
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering and not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            ordering = [*ordering, '-id' if ordering[0].startswith('-') else 'id']
+        return ordering
@@ -0,0 +1,105 @@
+"""
+Password hashing off the request workers.
+
+PBKDF2 at Django's default iterations costs tens of milliseconds of CPU per
+call. Run on the request workers, a burst of registrations or logins takes
+every core and every worker, and the cheap requests starve. Here hashing
+runs in a small process pool (PASSWORD_HASH_WORKERS processes per server
+process), and at most PASSWORD_HASH_QUEUE hashes run or wait at once.
+Past that a call fails straight away with HashingBusy, a 429, and its
+request worker is free again.
+
+The count of hashes in flight lives in the cache. With a cache shared by
+the server processes (CACHE_BACKEND), the limit covers all of them and
+should stay below the number of request workers, so some are always free
+for other requests. With the default per-process cache it applies to
+each process. With PASSWORD_HASH_WORKERS = 0 hashing runs inline, still
+bounded, e.g. for development.
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.cache import cache
+from rest_framework.exceptions import Throttled
+
+
+class HashingBusy(Throttled):
+    default_detail = 'Too many sign-ins in progress, try again shortly.'
+
+
+_lock = threading.Lock()
+_pool = None
+_pool_pid = None
+
+IN_FLIGHT_KEY = 'finances:hashing:in-flight'
+# The count starts over this often, so slots held by a killed process come back
+IN_FLIGHT_TIMEOUT = 60
+
+
+def _init_worker():
+    # Hash with the CPU that request workers leave over
+    os.nice(10)
+    # Spawned workers start without Django; forked ones already have it
+    django.setup()
+
+
+def _make_password(raw_password):
+    return hashers.make_password(raw_password)
+
+
+def _check_password(raw_password, encoded):
+    upgraded = []
+    valid = hashers.check_password(
+        raw_password, encoded, setter=lambda raw: upgraded.append(hashers.make_password(raw))
+    )
+    return valid, upgraded[0] if upgraded else None
+
+
+def _executor():
+    global _pool, _pool_pid
+    with _lock:
+        # A pool is only usable from the process that started it
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, initializer=_init_worker)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _run(func, *args):
+    cache.add(IN_FLIGHT_KEY, 0, IN_FLIGHT_TIMEOUT)
+    try:
+        in_flight = cache.incr(IN_FLIGHT_KEY)
+    except ValueError:
+        # Expired between add() and incr()
+        cache.add(IN_FLIGHT_KEY, 1, IN_FLIGHT_TIMEOUT)
+        in_flight = 1
+    try:
+        if in_flight > settings.PASSWORD_HASH_QUEUE:
+            raise HashingBusy(wait=1)
+        if not settings.PASSWORD_HASH_WORKERS:
+            return func(*args)
+        return _executor().submit(func, *args).result()
+    finally:
+        try:
+            cache.decr(IN_FLIGHT_KEY)
+        except ValueError:
+            # Started over since; nothing to give back
+            pass
+
+
+def make_password(raw_password):
+    """hashers.make_password() in the pool."""
+    return _run(_make_password, raw_password)
+
+
+def check_password(raw_password, encoded):
+    """
+    (valid, upgraded) for `raw_password` against `encoded`, in the pool.
+    `upgraded` is a fresh hash to store when `encoded` uses an outdated
+    hasher or iteration count, as check_password()'s setter would.
+    """
+    return _run(_check_password, raw_password, encoded)
@@ -0,0 +1,119 @@
+import csv
+import io
+from collections import defaultdict
+from decimal import Decimal
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import Budget, Category, CategoryBalance, FlowRollup, Item, ToBuy, Transaction
+from .serializers import BudgetSerializer, ItemSerializer, ToBuySerializer
+from .summary import invalidate_summary
+
+BATCH_SIZE = 500
+
+# URL kind -> (model, serializer used to validate each row)
+IMPORTERS = {
+    'items': (Item, ItemSerializer),
+    'budgets': (Budget, BudgetSerializer),
+    'to-buy': (ToBuy, ToBuySerializer),
+}
+
+
+class PreloadedCategoryField(serializers.PrimaryKeyRelatedField):
+    """Resolves category ids from a dict loaded once per batch instead of one query per row."""
+
+    def __init__(self, categories, **kwargs):
+        self.categories = categories
+        super().__init__(queryset=Category.objects.all(), **kwargs)
+
+    def to_internal_value(self, data):
+        try:
+            return self.categories[int(data)]
+        except (KeyError, TypeError, ValueError):
+            return super().to_internal_value(data)
+
+
+def csv_rows(upload):
+    """Yield CSV rows from an uploaded file one at a time, without reading it all into memory."""
+    text = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+    yield from csv.DictReader(text)
+
+
+def import_rows(kind, rows, user):
+    """
+    Validate `rows` in batches with the model's serializer and bulk-insert the
+    valid ones for `user`. Invalid rows are reported and skipped; they don't
+    abort the rest of the import.
+
+    Returns {'created': <count>, 'errors': [{'row': <index>, 'errors': {...}}]}.
+    """
+    model, serializer_class = IMPORTERS[kind]
+    created = 0
+    errors = []
+    rows = iter(rows)
+    offset = 0
+    while True:
+        batch = list(islice(rows, BATCH_SIZE))
+        if not batch:
+            break
+        instances = []
+        validator = serializer_class()
+        validator.fields['category'] = PreloadedCategoryField(
+            Category.objects.in_bulk(_category_ids(batch))
+        )
+        for index, row in enumerate(batch, start=offset):
+            try:
+                if not isinstance(row, dict):
+                    raise serializers.ValidationError({'non_field_errors': ['Expected an object.']})
+                validated = validator.run_validation(row)
+            except serializers.ValidationError as exc:
+                errors.append({'row': index, 'errors': exc.detail})
+                continue
+            instances.append(model(user=user, **validated))
+        offset += len(batch)
+        if instances:
+            _bulk_insert(model, instances)
+            created += len(instances)
+    if created:
+        # bulk_create sends no post_save signals
+        invalidate_summary(user.pk)
+    return {'created': created, 'errors': errors}
+
+
+def _category_ids(batch):
+    ids = set()
+    for row in batch:
+        try:
+            ids.add(int(row['category']))
+        except (KeyError, TypeError, ValueError):
+            pass
+    return ids
+
+
+def _bulk_insert(model, instances):
+    with transaction.atomic():
+        if model is not Item:
+            model.objects.bulk_create(instances)
+            return
+        # bulk_create skips Item.save(), so apply what it does by hand:
+        # a new deposit starts with its full amount spendable, is journaled,
+        # and is added to the ledger and the rollups
+        ledger_deltas = defaultdict(lambda: [Decimal('0.00'), 0])
+        for item in instances:
+            item.current_balance = item.amount
+            delta = ledger_deltas[item.user_id, item.category_id]
+            delta[0] += item.amount
+            delta[1] += 1
+        Item.objects.bulk_create(instances)
+        Transaction.objects.bulk_create(
+            Transaction(user_id=item.user_id, category_id=item.category_id, item_id=item.pk,
+                        kind=Transaction.DEPOSIT, amount=item.amount, created_at=item.created_at)
+            for item in instances
+        )
+        now = timezone.now()
+        for (user_id, category_id), (balance, count) in ledger_deltas.items():
+            CategoryBalance.objects.adjust(user_id, category_id, balance, count)
+            FlowRollup.objects.add(user_id, category_id, Transaction.DEPOSIT, balance, now)
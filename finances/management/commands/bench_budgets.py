@@ -0,0 +1,58 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from finances.models import Budget, Category, Item
+
+
+class Command(BaseCommand):
+    help = (
+        "Compute budget vs actual for every budget of one user. "
+        "Runs inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--budgets', type=int, default=1000)
+        parser.add_argument('--items', type=int, default=100000)
+        parser.add_argument('--categories', type=int, default=50)
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        with transaction.atomic():
+            user = User.objects.create_user(username='bench-budgets')
+            categories = Category.objects.bulk_create(
+                Category(name=f'bench-budgets-{i}') for i in range(options['categories'])
+            )
+            now = timezone.now()
+            items = Item.objects.bulk_create(
+                Item(user=user, category=random.choice(categories), name=f'deposit {i}',
+                     amount=Decimal('10.00'), current_balance=Decimal(random.randint(0, 10)))
+                for i in range(options['items'])
+            )
+            # Spread the deposits over the last 60 days
+            for item in items:
+                item.created_at = now - timedelta(minutes=random.randint(0, 60 * 24 * 60))
+            Item.objects.bulk_update(items, ['created_at'], batch_size=500)
+            Budget.objects.bulk_create(
+                Budget(user=user, category=random.choice(categories), name=f'budget {i}',
+                       amount=Decimal('100.00'), type=random.choice(['Daily', 'Weekly', 'Monthly']))
+                for i in range(options['budgets'])
+            )
+
+            started = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                rows = Budget.attach_spent(Budget.objects.filter(user=user))
+            elapsed = (time.perf_counter() - started) * 1000
+
+            self.stdout.write(
+                f"{len(rows)} budgets x {options['items']} items: "
+                f"{len(queries)} queries, {elapsed:.1f} ms"
+            )
+            transaction.set_rollback(True)
@@ -0,0 +1,104 @@
+import multiprocessing
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from finances.models import Category, Item
+from finances.views import CategoryViewSet
+
+USERNAME = 'bench-contention'
+
+
+def _worker(user_id, category_id, count, seed, results):
+    # Forked children must not share the parent's database connection
+    connections.close_all()
+    random.seed(seed)
+    user = User.objects.get(pk=user_id)
+    view = CategoryViewSet.as_view({'post': 'withdraw'})
+    factory = APIRequestFactory()
+    latencies = []
+    locked = 0
+    for i in range(count):
+        started = time.perf_counter()
+        try:
+            # Half deposits through Item.save(), half withdrawals through the endpoint
+            if i % 2 == 0:
+                Item.objects.create(user=user, category_id=category_id, name=f'deposit {seed}-{i}',
+                                    amount=Decimal('5.00'))
+            else:
+                amount = Decimal(random.randint(1, 500)) / 100
+                request = factory.post(f'/api/categories/{category_id}/withdraw/',
+                                       {'amount': str(amount)}, format='json')
+                force_authenticate(request, user=user)
+                view(request, pk=category_id)
+        except OperationalError:
+            locked += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+    connections.close_all()
+    results.put((latencies, locked))
+
+
+class Command(BaseCommand):
+    help = (
+        "Deposit and withdraw from several processes at once and report "
+        "throughput, latency and 'database is locked' failures under the "
+        "configured SQLite pragmas. Compare settings through the environment, "
+        "e.g. SQLITE_JOURNAL_MODE=delete SQLITE_BUSY_TIMEOUT=0. Creates and "
+        "deletes its own user and category; run it against a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8)
+        parser.add_argument('--operations', type=int, default=2000,
+                            help='Total writes across all processes.')
+
+    def handle(self, *args, **options):
+        User.objects.filter(username=USERNAME).delete()
+        Category.objects.filter(name=USERNAME).delete()
+        user = User.objects.create_user(username=USERNAME)
+        category = Category.objects.create(name=USERNAME)
+        try:
+            self.run(user, category, options)
+        finally:
+            category.delete()
+            user.delete()
+
+    def run(self, user, category, options):
+        if hasattr(connection, 'applied_pragmas'):
+            applied = connection.applied_pragmas()
+            self.stdout.write(' '.join(f'{name}={value}' for name, value in applied.items()))
+
+        processes = options['processes']
+        per_process = options['operations'] // processes
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        workers = [
+            context.Process(target=_worker, args=(user.pk, category.pk, per_process, seed, results))
+            for seed in range(processes)
+        ]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        outcomes = [results.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency * 1000 for outcome in outcomes for latency in outcome[0])
+        locked = sum(outcome[1] for outcome in outcomes)
+        total = len(latencies) + locked
+        self.stdout.write(
+            f"{total} writes from {processes} processes in {elapsed:.2f}s: "
+            f"{len(latencies) / elapsed:.0f} committed/s, {locked} failed with 'database is locked'"
+        )
+        if latencies:
+            p50 = latencies[len(latencies) // 2]
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            self.stdout.write(f"latency p50 {p50:.1f} ms, p99 {p99:.1f} ms")
@@ -0,0 +1,82 @@
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from finances.models import Category, CategoryBalance, Item, ToBuy
+from finances.views import ToBuyViewSet
+
+USERNAME = 'bench-purchase'
+
+
+class Command(BaseCommand):
+    help = (
+        "Buy to-buy entries spread over several categories with one "
+        "/api/to-buy/purchase/ call, and one call per entry, and report "
+        "queries and time for each. Every purchase commits, as in production. "
+        "Creates and deletes its own user and categories; run it against a "
+        "scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 50, 100],
+                            help='Entries bought in each run.')
+        parser.add_argument('--categories', type=int, default=5)
+        parser.add_argument('--deposits', type=int, default=1000, help='Deposits per category.')
+
+    def handle(self, *args, **options):
+        User.objects.filter(username=USERNAME).delete()
+        Category.objects.filter(name__startswith=USERNAME).delete()
+        user = User.objects.create_user(username=USERNAME)
+        categories = [Category.objects.create(name=f'{USERNAME}-{i}') for i in range(options['categories'])]
+        try:
+            self.run(user, categories, options)
+        finally:
+            Category.objects.filter(name__startswith=USERNAME).delete()
+            user.delete()
+
+    def run(self, user, categories, options):
+        for category in categories:
+            Item.objects.bulk_create(
+                Item(user=user, category=category, name=f'deposit {i}',
+                     amount=Decimal('10.00'), current_balance=Decimal('10.00'))
+                for i in range(options['deposits'])
+            )
+            # bulk_create() skips the ledger
+            CategoryBalance.objects.adjust(user.id, category.id, Decimal('10.00') * options['deposits'],
+                                           options['deposits'])
+        # The first withdrawal in a category also creates its rollup buckets
+        self.buy(user, categories, len(categories), 'batch')
+        self.stdout.write(f"{'entries':>8} {'mode':<12} {'requests':>8} {'queries':>8} {'ms':>10}")
+        for size in options['sizes']:
+            for mode in ('batch', 'one by one'):
+                started = time.perf_counter()
+                with CaptureQueriesContext(connection) as queries:
+                    calls = self.buy(user, categories, size, mode)
+                elapsed = (time.perf_counter() - started) * 1000
+                self.stdout.write(
+                    f"{size:>8} {mode:<12} {calls:>8} {len(queries):>8} {elapsed:>10.1f}"
+                )
+
+    def buy(self, user, categories, size, mode):
+        entries = ToBuy.objects.bulk_create(
+            ToBuy(user=user, category=categories[i % len(categories)], name=f'entry {i}',
+                  amount=Decimal('3.00'))
+            for i in range(size)
+        )
+        ids = [entry.id for entry in entries]
+        calls = [ids] if mode == 'batch' else [[pk] for pk in ids]
+        for call in calls:
+            self.purchase(user, call)
+        return len(calls)
+
+    def purchase(self, user, ids):
+        request = APIRequestFactory().post('/api/to-buy/purchase/', {'ids': ids}, format='json')
+        force_authenticate(request, user=user)
+        response = ToBuyViewSet.as_view({'post': 'purchase'})(request)
+        if response.status_code != 200:
+            raise RuntimeError(f'Purchase failed: {response.data}')
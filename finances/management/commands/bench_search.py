@@ -0,0 +1,124 @@
+import itertools
+import random
+import string
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from finances.models import Budget, Category, Item, ToBuy
+from finances.search import KINDS, matching, search
+
+
+def _vocabulary(size):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(random.choices(string.ascii_lowercase, k=random.randint(4, 9))))
+    return sorted(words)
+
+
+def _like(query):
+    condition = Q()
+    for word in query.split():
+        condition &= Q(name__icontains=word) | Q(description__icontains=word)
+    return condition
+
+
+class Command(BaseCommand):
+    help = (
+        "Search latency over items, budgets and to-buy entries, through the "
+        "full-text index and through the LIKE scans it replaces: per user "
+        "(/api/search/, for a user holding --heavy-share of the rows) and "
+        "across everyone (admin changelist search, which also counts the "
+        "matches). Runs inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000,
+                            help='Rows across the three tables.')
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--heavy-share', type=float, default=0.05,
+                            help="Share of the rows belonging to the searching user.")
+        parser.add_argument('--repeat', type=int, default=50, help='Searches per query through the index.')
+        parser.add_argument('--like-repeat', type=int, default=5,
+                            help='Searches per query through LIKE, which is much slower.')
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        vocabulary = _vocabulary(20000)
+        # Zipf-like: a few words ("food", "rent") are in most rows
+        cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+
+        def text(words):
+            return ' '.join(random.choices(vocabulary, cum_weights=cum_weights, k=words))
+
+        with transaction.atomic():
+            users = User.objects.bulk_create(
+                User(username=f'bench-search-{i}') for i in range(options['users'])
+            )
+            heavy = users[0]
+            category = Category.objects.create(name='bench-search')
+            started = time.perf_counter()
+            per_kind = options['rows'] // 3
+            for model in (Item, Budget, ToBuy):
+                extra = {'type': 'Monthly'} if model is Budget else {}
+                for offset in range(0, per_kind, 10000):
+                    model.objects.bulk_create(
+                        model(user=heavy if random.random() < options['heavy_share'] else random.choice(users),
+                              category=category, name=text(3), description=text(12),
+                              amount=Decimal('10.00'), **extra)
+                        for _ in range(min(10000, per_kind - offset))
+                    )
+            self.stdout.write(
+                f"Loaded {per_kind * 3} rows ({options['heavy_share']:.0%} of them one user's) "
+                f"in {time.perf_counter() - started:.1f} s"
+            )
+
+            queries = {
+                'common word': vocabulary[0],
+                'rare word': vocabulary[5000],
+                'two words': f'{vocabulary[3]} {vocabulary[40]}',
+                'prefix': vocabulary[200][:3],
+            }
+            self.stdout.write(
+                f"{'':<18} {'query':<18} {'hits':>7} {'index p50':>10} {'p99 ms':>8} "
+                f"{'like p50':>10} {'p99 ms':>8}"
+            )
+            for label, query in queries.items():
+                self.report('user', label, query, options,
+                            lambda: len(search(heavy, query, limit=20)),
+                            lambda: len(self.search_like(heavy, query)))
+            for label, query in queries.items():
+                self.report('admin', label, query, options,
+                            lambda: sum(matching(model.objects.all(), query).count()
+                                        for model, _ in KINDS.values()),
+                            lambda: sum(model.objects.filter(_like(query)).count()
+                                        for model, _ in KINDS.values()))
+            transaction.set_rollback(True)
+
+    def search_like(self, user, query):
+        # Newest 20 of each table; LIKE has nothing to rank by
+        hits = []
+        for model, _ in KINDS.values():
+            hits += model.objects.filter(_like(query), user=user).order_by('-created_at').values_list('id')[:20]
+        return hits
+
+    def report(self, scope, label, query, options, index, like):
+        hits, index_p50, index_p99 = self.time(index, options['repeat'])
+        _, like_p50, like_p99 = self.time(like, options['like_repeat'])
+        self.stdout.write(
+            f"{scope + ' ' + label:<18} {query!r:<18} {hits:>7} {index_p50:>10.2f} {index_p99:>8.2f} "
+            f"{like_p50:>10.2f} {like_p99:>8.2f}"
+        )
+
+    def time(self, run, repeat):
+        latencies = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            hits = run()
+            latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+        return hits, latencies[len(latencies) // 2], latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
@@ -0,0 +1,81 @@
+import time
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework.renderers import JSONRenderer
+
+from finances.models import Budget, Category, Item
+from finances.renderers import FastJSONRenderer
+from finances.serializers import BudgetSerializer, ItemSerializer
+from finances.views import BudgetViewSet, ItemViewSet
+
+
+class Command(BaseCommand):
+    help = (
+        "Serialize items and budgets with the bare per-user queryset and with "
+        "the viewsets' joined queryset, then compare rendering whole lists "
+        "through the serializers and through values() rows. Runs inside a "
+        "transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+
+    def measure(self, label, serializer_class, queryset):
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            serializer_class(queryset, many=True).data
+        elapsed = (time.perf_counter() - started) * 1000
+        self.stdout.write(f"{label:<20} {len(queries):>8} {elapsed:>10.1f}")
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        with transaction.atomic():
+            user = User.objects.create_user(username='bench-serializers')
+            category = Category.objects.create(name='bench-serializers')
+            Item.objects.bulk_create(
+                Item(user=user, category=category, name=f'deposit {i}',
+                     amount=Decimal('10.00'), current_balance=Decimal('10.00'))
+                for i in range(rows)
+            )
+            Budget.objects.bulk_create(
+                Budget(user=user, category=category, name=f'budget {i}', amount=Decimal('10.00'))
+                for i in range(rows)
+            )
+
+            request = SimpleNamespace(user=user)
+            self.stdout.write(f"{'':<20} {'queries':>8} {'ms':>10}")
+            for viewset_class, model, serializer_class in (
+                (ItemViewSet, Item, ItemSerializer),
+                (BudgetViewSet, Budget, BudgetSerializer),
+            ):
+                name = model.__name__.lower()
+                self.measure(f"{name} before", serializer_class, model.objects.filter(user=user))
+                view = viewset_class(action='list', request=request)
+                self.measure(f"{name} after", serializer_class, view.get_queryset())
+
+            # Full list rendering: model instances through the serializer and
+            # DRF's renderer, against values() rows and the orjson renderer
+            self.stdout.write(f"\n{'':<20} {'bytes':>10} {'rows/s':>10}")
+            for viewset_class, model in ((ItemViewSet, Item), (BudgetViewSet, Budget)):
+                name = model.__name__.lower()
+                view = viewset_class(action='list', request=request)
+                queryset = view.get_queryset()
+                self.throughput(f"{name} serializer", rows, lambda: JSONRenderer().render(
+                    view.get_serializer_class()(queryset, many=True).data
+                ))
+                self.throughput(f"{name} values", rows, lambda: FastJSONRenderer().render(
+                    view.values_serializer.to_representation(view.values_serializer.rows(queryset))
+                ))
+            transaction.set_rollback(True)
+
+    def throughput(self, label, rows, render):
+        started = time.perf_counter()
+        body = render()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"{label:<20} {len(body):>10} {rows / elapsed:>10.0f}")
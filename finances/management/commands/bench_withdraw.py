@@ -0,0 +1,47 @@
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from finances.models import Category, Item
+from finances.withdrawals import fifo_withdraw
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark FIFO withdrawals against categories with a growing number "
+        "of deposits. Runs inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000],
+            help='Number of deposits to create for each run.'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'deposits':>10} {'drained':>10} {'queries':>8} {'ms':>10}")
+        with transaction.atomic():
+            user = User.objects.create_user(username='bench-withdraw')
+            for size in options['sizes']:
+                category = Category.objects.create(name=f'bench-withdraw-{size}')
+                Item.objects.bulk_create(
+                    Item(user=user, category=category, name=f'deposit {i}',
+                         amount=Decimal('10.00'), current_balance=Decimal('10.00'))
+                    for i in range(size)
+                )
+                # Drain half of the deposits plus a partial one.
+                amount = Decimal('10.00') * (size // 2) + Decimal('5.00')
+
+                started = time.perf_counter()
+                with CaptureQueriesContext(connection) as queries:
+                    affected = fifo_withdraw(category.itemsItem.all(), amount)
+                elapsed = (time.perf_counter() - started) * 1000
+
+                self.stdout.write(
+                    f"{size:>10} {len(affected):>10} {len(queries):>8} {elapsed:>10.1f}"
+                )
+            transaction.set_rollback(True)
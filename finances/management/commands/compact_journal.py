@@ -0,0 +1,77 @@
+from datetime import datetime, time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from finances.models import BalanceSnapshot, Category, Transaction
+
+
+class Command(BaseCommand):
+    help = (
+        "Snapshot every user's per-category balance as of --before (default: "
+        "start of today) from the previous snapshot plus the journal since. "
+        "With --prune, journal rows covered by the new snapshots are deleted; "
+        "balances before then are only known at snapshot times."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', help='Snapshot time, YYYY-MM-DD (start of that day).')
+        parser.add_argument('--prune', action='store_true',
+                            help='Delete journal rows at or before the snapshot time.')
+
+    def handle(self, *args, **options):
+        if options['before']:
+            day = parse_date(options['before'])
+            if day is None:
+                raise CommandError('--before must be a YYYY-MM-DD date')
+        else:
+            day = timezone.localdate()
+        as_of = timezone.make_aware(datetime.combine(day, time.min))
+
+        # Latest snapshot of each (user, category) pair at or before as_of
+        latest = {}
+        for snapshot in BalanceSnapshot.objects.filter(as_of__lte=as_of).order_by('as_of'):
+            latest[snapshot.user_id, snapshot.category_id] = snapshot
+        balances = {key: snapshot.balance for key, snapshot in latest.items()}
+
+        # Each pair adds the journal since its own snapshot. Pairs are grouped
+        # by snapshot time, so this is one grouped query per distinct time
+        # (usually just the previous compaction) plus one for new pairs.
+        # Journal rows of deleted categories and users are history only
+        journal = Transaction.objects.filter(
+            Q(user__isnull=True) | Q(user__in=User.objects.all()),
+            category__in=Category.objects.all(),
+            created_at__lte=as_of,
+        ).order_by()
+        for start in {snapshot.as_of for snapshot in latest.values()} | {None}:
+            segment = journal if start is None else journal.filter(created_at__gt=start)
+            for row in segment.values('user_id', 'category_id').annotate(total=Sum('amount')):
+                key = (row['user_id'], row['category_id'])
+                snapshot = latest.get(key)
+                if (snapshot.as_of if snapshot else None) == start:
+                    balances[key] = balances.get(key, Decimal('0.00')) + row['total']
+
+        with transaction.atomic():
+            created = BalanceSnapshot.objects.bulk_create(
+                [
+                    BalanceSnapshot(user_id=user_id, category_id=category_id, as_of=as_of,
+                                    balance=balance.quantize(Decimal('0.01')))
+                    for (user_id, category_id), balance in balances.items()
+                    # Already compacted at this time
+                    if not (latest.get((user_id, category_id)) and latest[user_id, category_id].as_of == as_of)
+                ],
+                batch_size=500,
+            )
+            pruned = 0
+            if options['prune']:
+                pruned, _ = journal.delete()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {len(created)} snapshots as of {as_of.isoformat()}"
+            + (f", pruned {pruned} journal rows." if options['prune'] else ".")
+        ))
@@ -0,0 +1,73 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_PATHS = (
+    'categories/',
+    'categories/total_assets/',
+    'items/',
+    'auth/profile/',
+    'summary/',
+)
+
+
+def _fetch(url, token):
+    request = Request(url, headers={'Authorization': f'Bearer {token}'} if token else {})
+    started = time.perf_counter()
+    try:
+        with urlopen(request, timeout=30) as response:
+            response.read()
+            status = response.status
+    except HTTPError as exc:
+        status = exc.code
+    except OSError:
+        status = None
+    return status, time.perf_counter() - started
+
+
+def _percentile(latencies, fraction):
+    return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire concurrent GETs at the dashboard's read endpoints of one or more "
+        "running servers and report throughput and p50/p99 latency, e.g. "
+        "--target wsgi=http://127.0.0.1:8000/api/ "
+        "--target asgi=http://127.0.0.1:8001/api/async/"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', action='append', required=True,
+                            help='name=base URL; repeat to compare servers.')
+        parser.add_argument('--token', help='JWT access token sent as a Bearer header.')
+        parser.add_argument('--paths', nargs='+', default=DEFAULT_PATHS,
+                            help='Paths under each base URL, requested round-robin.')
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        targets = []
+        for target in options['target']:
+            name, sep, base = target.partition('=')
+            if not sep or not base:
+                raise CommandError(f'--target must be name=url, got {target!r}')
+            targets.append((name, base if base.endswith('/') else base + '/'))
+
+        self.stdout.write(f"{'target':<12} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for name, base in targets:
+            urls = [base + options['paths'][i % len(options['paths'])] for i in range(options['requests'])]
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+                results = list(pool.map(lambda url: _fetch(url, options['token']), urls))
+            elapsed = time.perf_counter() - started
+
+            latencies = sorted(latency * 1000 for _, latency in results)
+            errors = sum(1 for status, _ in results if status != 200)
+            self.stdout.write(
+                f"{name:<12} {len(results) / elapsed:>8.0f} {_percentile(latencies, 0.5):>8.1f} "
+                f"{_percentile(latencies, 0.99):>8.1f} {errors:>7}"
+            )
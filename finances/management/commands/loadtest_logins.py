@@ -0,0 +1,102 @@
+import itertools
+import json
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand
+
+from .loadtest import _fetch, _percentile
+
+
+def _post(url, payload):
+    request = Request(url, data=json.dumps(payload).encode(), headers={'Content-Type': 'application/json'})
+    try:
+        with urlopen(request, timeout=60) as response:
+            response.read()
+            return response.status
+    except HTTPError as exc:
+        return exc.code
+    except OSError:
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure read latency on a running server, first quiet and then during "
+        "a storm of logins or registrations, e.g. --url http://127.0.0.1:8000/api/ "
+        "--token <access token>. Start the server with high LOGIN_IP_RATE and "
+        "LOGIN_USERNAME_RATE so the storm reaches password hashing instead of "
+        "being throttled."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000/api/')
+        parser.add_argument('--token', required=True, help='JWT access token for the reads.')
+        parser.add_argument('--read-path', default='categories/total_assets/')
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--storm', choices=['login', 'register'], default='login',
+                            help='login: unknown usernames (each still hashes once); register: new users.')
+        parser.add_argument('--stormers', type=int, default=32)
+        parser.add_argument('--storm-rate', type=float, default=20.0,
+                            help='Storm requests per second across all stormers, sent whether or not '
+                                 'earlier ones were answered (as long as a stormer is free).')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds per phase.')
+
+    def handle(self, *args, **options):
+        base = options['url'] if options['url'].endswith('/') else options['url'] + '/'
+        self.stdout.write(f"{'phase':<8} {'reads/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'storm responses':<30}")
+        for phase, stormers in (('quiet', 0), ('storm', options['stormers'])):
+            reads, storm = self.run_phase(base, options, stormers)
+            latencies = sorted(latency * 1000 for status, latency in reads if status == 200)
+            statuses = ', '.join(f'{status}: {count}' for status, count in sorted(storm.items(), key=str)) or '-'
+            self.stdout.write(
+                f"{phase:<8} {len(latencies) / options['duration']:>8.0f} "
+                f"{_percentile(latencies, 0.5):>8.1f} {_percentile(latencies, 0.99):>8.1f} {statuses:<30}"
+            )
+
+    def run_phase(self, base, options, stormers):
+        deadline = time.monotonic() + options['duration']
+        reads = []
+        storm = Counter()
+        lock = threading.Lock()
+        run = uuid.uuid4().hex[:8]
+        counter = itertools.count()
+
+        def read():
+            while time.monotonic() < deadline:
+                result = _fetch(base + options['read_path'], options['token'])
+                with lock:
+                    reads.append(result)
+
+        interval = stormers / options['storm_rate'] if stormers else 0
+
+        def hammer(start):
+            next_at = start
+            while time.monotonic() < deadline:
+                time.sleep(max(0.0, next_at - time.monotonic()))
+                next_at += interval
+                n = next(counter)
+                if options['storm'] == 'register':
+                    password = f'storm passphrase {run}'
+                    status = _post(base + 'auth/register/', {
+                        'username': f'storm-{run}-{n}', 'email': f'storm-{run}-{n}@example.com',
+                        'password': password, 'password2': password,
+                    })
+                else:
+                    status = _post(base + 'auth/login/', {'username': f'storm-{run}-{n}', 'password': 'wrong'})
+                with lock:
+                    storm[status] += 1
+
+        with ThreadPoolExecutor(max_workers=options['readers'] + stormers) as pool:
+            for _ in range(options['readers']):
+                pool.submit(read)
+            now = time.monotonic()
+            for i in range(stormers):
+                # Staggered, so the storm arrives evenly
+                pool.submit(hammer, now + interval * i / stormers)
+        return reads, storm
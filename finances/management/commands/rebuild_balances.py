@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from finances.models import CategoryBalance
+
+
+class Command(BaseCommand):
+    help = "Rebuild the CategoryBalance ledger from the raw items, or verify it with --verify."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Only compare the ledger against the items and report mismatches.'
+        )
+
+    def handle(self, *args, **options):
+        if not options['verify']:
+            CategoryBalance.objects.rebuild()
+            self.stdout.write(self.style.SUCCESS(
+                f"Rebuilt {CategoryBalance.objects.count()} category balance rows."
+            ))
+            return
+
+        expected = CategoryBalance.objects.expected()
+        actual = {
+            (row.user_id, row.category_id): (row.balance, row.items_count)
+            for row in CategoryBalance.objects.all()
+        }
+        mismatches = []
+        for key in sorted(expected.keys() | actual.keys(), key=str):
+            # Rows left at zero by deletes are equivalent to missing rows
+            want = expected.get(key, (0, 0))
+            have = actual.get(key, (0, 0))
+            if want != have:
+                mismatches.append((key, want, have))
+
+        for (user_id, category_id), want, have in mismatches:
+            self.stdout.write(
+                f"user={user_id} category={category_id}: "
+                f"expected balance={want[0]} items={want[1]}, "
+                f"ledger has balance={have[0]} items={have[1]}"
+            )
+        if mismatches:
+            raise CommandError(f"{len(mismatches)} ledger rows are out of sync; run rebuild_balances.")
+        self.stdout.write(self.style.SUCCESS("Category balance ledger matches the items."))
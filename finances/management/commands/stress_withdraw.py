@@ -0,0 +1,113 @@
+import multiprocessing
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Min, Sum
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from finances.models import Category, CategoryBalance, Item
+from finances.views import CategoryViewSet
+
+USERNAME = 'stress-withdraw'
+
+
+def _worker(user_id, category_id, count, seed, results):
+    # Forked children must not share the parent's database connection
+    connections.close_all()
+    random.seed(seed)
+    user = User.objects.get(pk=user_id)
+    view = CategoryViewSet.as_view({'post': 'withdraw'})
+    factory = APIRequestFactory()
+    withdrawn = Decimal('0.00')
+    ok = rejected = failed = 0
+    for _ in range(count):
+        amount = Decimal(random.randint(1, 500)) / 100
+        request = factory.post(f'/api/categories/{category_id}/withdraw/', {'amount': str(amount)}, format='json')
+        force_authenticate(request, user=user)
+        try:
+            response = view(request, pk=category_id)
+        except Exception:
+            failed += 1
+            continue
+        if response.status_code == 200:
+            ok += 1
+            withdrawn += amount
+        else:
+            rejected += 1
+    connections.close_all()
+    results.put((ok, rejected, failed, withdrawn))
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire parallel withdrawals from several processes at one user's category "
+        "and check that no balance goes negative. Creates and deletes its own "
+        "user and category; run it against a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8)
+        parser.add_argument('--withdrawals', type=int, default=2000,
+                            help='Total withdrawals across all processes.')
+        parser.add_argument('--deposits', type=int, default=200)
+
+    def handle(self, *args, **options):
+        User.objects.filter(username=USERNAME).delete()
+        Category.objects.filter(name=USERNAME).delete()
+        user = User.objects.create_user(username=USERNAME)
+        category = Category.objects.create(name=USERNAME)
+        try:
+            self.run(user, category, options)
+        finally:
+            category.delete()
+            user.delete()
+
+    def run(self, user, category, options):
+        # Fewer funds than the withdrawals ask for, so the later ones must be rejected
+        for i in range(options['deposits']):
+            Item.objects.create(user=user, category=category, name=f'deposit {i}', amount=Decimal('5.00'))
+        initial = CategoryBalance.objects.total(user=user, category=category)
+
+        processes = options['processes']
+        per_process = options['withdrawals'] // processes
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        workers = [
+            context.Process(target=_worker, args=(user.pk, category.pk, per_process, seed, results))
+            for seed in range(processes)
+        ]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        outcomes = [results.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        ok = sum(outcome[0] for outcome in outcomes)
+        rejected = sum(outcome[1] for outcome in outcomes)
+        failed = sum(outcome[2] for outcome in outcomes)
+        withdrawn = sum((outcome[3] for outcome in outcomes), Decimal('0.00'))
+
+        items = Item.objects.filter(category=category)
+        lowest = items.aggregate(lowest=Min('current_balance'))['lowest']
+        remaining = items.aggregate(total=Sum('current_balance'))['total']
+        ledger = CategoryBalance.objects.total(user=user, category=category)
+
+        self.stdout.write(
+            f"{ok + rejected + failed} withdrawals from {processes} processes in {elapsed:.2f}s "
+            f"({(ok + rejected + failed) / elapsed:.0f}/s): "
+            f"{ok} succeeded, {rejected} rejected, {failed} errored"
+        )
+        self.stdout.write(f"deposited {initial}, withdrawn {withdrawn}, remaining {remaining}, ledger {ledger}")
+
+        if lowest < 0:
+            raise CommandError(f"A deposit went negative: {lowest}")
+        if remaining != initial - withdrawn or ledger != remaining:
+            raise CommandError("Balances do not add up to the successful withdrawals")
+        self.stdout.write(self.style.SUCCESS("No overdraft, balances consistent."))
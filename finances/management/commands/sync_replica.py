@@ -0,0 +1,42 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from finances.routers import REPLICA
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database into the read replica file "
+        "(READ_REPLICA_NAME) with SQLite's online backup, once or every "
+        "--interval seconds. Stands in for real replication in local setups."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float,
+                            help='Keep copying, waiting this many seconds in between.')
+
+    def handle(self, *args, **options):
+        if REPLICA not in connections.settings:
+            raise CommandError('No replica configured; set READ_REPLICA_NAME.')
+        primary = connections[DEFAULT_DB_ALIAS].settings_dict
+        replica = connections[REPLICA].settings_dict
+        if primary['ENGINE'] != replica['ENGINE'] or connections[REPLICA].vendor != 'sqlite':
+            raise CommandError('sync_replica only copies between SQLite files.')
+
+        while True:
+            started = time.perf_counter()
+            source = sqlite3.connect(primary['NAME'])
+            target = sqlite3.connect(replica['NAME'])
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+                source.close()
+            self.stdout.write(f"Copied {primary['NAME']} to {replica['NAME']} "
+                              f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
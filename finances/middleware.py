@@ -0,0 +1,21 @@
+from .routers import SAFE_METHODS, current_request, mark_sticky
+
+
+class ReplicaRoutingMiddleware:
+    """Exposes the request to ReplicaRouter and makes users who just wrote read their writes."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = current_request.set(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        # DRF copies the user it authenticated back onto the Django request
+        user = getattr(request, 'user', None)
+        if (request.method not in SAFE_METHODS and response.status_code < 400
+                and user is not None and user.is_authenticated):
+            mark_sticky(user.pk)
+        return response
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.26 on 2026-10-17 17:29
+
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_balances(apps, schema_editor):
+    Item = apps.get_model('finances', 'Item')
+    CategoryBalance = apps.get_model('finances', 'CategoryBalance')
+    rows = Item.objects.order_by().values('user_id', 'category_id').annotate(
+        balance=models.Sum('current_balance'), items_count=models.Count('id')
+    )
+    CategoryBalance.objects.bulk_create(CategoryBalance(**row) for row in rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('finances', '0006_item_current_balance'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15)),
+                ('items_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balances', to='finances.category')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='category_balances', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='categorybalance',
+            constraint=models.UniqueConstraint(fields=('user', 'category'), name='unique_category_balance'),
+        ),
+        migrations.RunPython(populate_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.26 on 2026-10-17 17:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finances', '0007_categorybalance'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='budget',
+            index=models.Index(fields=['user', '-created_at'], name='budget_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['user', '-created_at'], name='item_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('current_balance__gt', 0)), fields=['category', 'created_at', 'id'], name='item_fifo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tobuy',
+            index=models.Index(fields=['user', '-created_at'], name='tobuy_user_created_idx'),
+        ),
+    ]
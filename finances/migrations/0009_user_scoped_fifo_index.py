@@ -0,0 +1,21 @@
+# Generated by Django 4.2.26 on 2026-10-17 17:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finances', '0008_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='item',
+            name='item_fifo_idx',
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('current_balance__gt', 0)), fields=['user', 'category', 'created_at', 'id'], name='item_fifo_idx'),
+        ),
+    ]
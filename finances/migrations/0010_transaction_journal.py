@@ -0,0 +1,72 @@
+# Generated by Django 4.2.26 on 2026-10-17 17:39
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def backfill_journal(apps, schema_editor):
+    # Open the journal with each existing deposit at its creation time, and
+    # what has been drawn from it so far as one withdrawal at migration time
+    Item = apps.get_model('finances', 'Item')
+    Transaction = apps.get_model('finances', 'Transaction')
+    now = django.utils.timezone.now()
+    entries = []
+    for item in Item.objects.iterator():
+        entries.append(Transaction(
+            user_id=item.user_id, category_id=item.category_id, item_id=item.id,
+            kind='deposit', amount=item.amount, created_at=item.created_at,
+        ))
+        if item.amount != item.current_balance:
+            entries.append(Transaction(
+                user_id=item.user_id, category_id=item.category_id, item_id=item.id,
+                kind='withdrawal', amount=item.current_balance - item.amount, created_at=now,
+            ))
+    Transaction.objects.bulk_create(entries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('finances', '0009_user_scoped_fifo_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateTimeField()),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='finances.category')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-as_of'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Transaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('deposit', 'Deposit'), ('withdrawal', 'Withdrawal'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('category', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='transactions', to='finances.category')),
+                ('item', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='transactions', to='finances.item')),
+                ('user', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='transactions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', 'category', 'created_at'], name='journal_user_cat_created_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='balancesnapshot',
+            constraint=models.UniqueConstraint(fields=('user', 'category', 'as_of'), name='unique_balance_snapshot'),
+        ),
+        migrations.RunPython(backfill_journal, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 4.2.26 on 2026-10-17 17:41
+
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def backfill_rollups(apps, schema_editor):
+    Transaction = apps.get_model('finances', 'Transaction')
+    FlowRollup = apps.get_model('finances', 'FlowRollup')
+    Category = apps.get_model('finances', 'Category')
+    columns = {'deposit': 'deposits', 'withdrawal': 'withdrawals', 'adjustment': 'adjustments'}
+    totals = {}
+    # Journal rows of deleted categories are history only
+    journal = Transaction.objects.filter(category__in=Category.objects.all())
+    for user_id, category_id, kind, amount, created_at in journal.values_list(
+        'user_id', 'category_id', 'kind', 'amount', 'created_at'
+    ).iterator():
+        day = timezone.localtime(created_at).date()
+        buckets = {
+            'day': day,
+            'week': day - timedelta(days=day.weekday()),
+            'month': day.replace(day=1),
+        }
+        value = -amount if kind == 'withdrawal' else amount
+        for period, bucket in buckets.items():
+            row = totals.setdefault((user_id, category_id, period, bucket), {
+                'deposits': Decimal('0.00'), 'withdrawals': Decimal('0.00'), 'adjustments': Decimal('0.00'),
+            })
+            row[columns[kind]] += value
+    FlowRollup.objects.bulk_create(
+        (
+            FlowRollup(user_id=user_id, category_id=category_id, period=period, bucket=bucket, **row)
+            for (user_id, category_id, period, bucket), row in totals.items()
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('finances', '0010_transaction_journal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlowRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('week', 'Week'), ('month', 'Month')], max_length=10)),
+                ('bucket', models.DateField()),
+                ('deposits', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15)),
+                ('withdrawals', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15)),
+                ('adjustments', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='flow_rollups', to='finances.category')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='flow_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['bucket'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='flowrollup',
+            constraint=models.UniqueConstraint(fields=('user', 'period', 'bucket', 'category'), name='unique_flow_rollup'),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.26 on 2026-10-17 18:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finances', '0011_flow_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['user', 'category', '-created_at'], name='item_user_cat_created_idx'),
+        ),
+    ]
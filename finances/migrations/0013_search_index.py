@@ -0,0 +1,80 @@
+from django.db import migrations
+
+# kind code -> table, as finances.search.KINDS; a document's rowid is id * 4 + code
+TABLES = {1: 'finances_item', 2: 'finances_budget', 3: 'finances_tobuy'}
+
+DOCUMENT_SQL = (
+    "setweight(to_tsvector('simple', name), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'B')"
+)
+
+
+def _fts_row(prefix, code):
+    return (
+        f"{prefix}.id * 4 + {code}, 'u' || coalesce({prefix}.user_id, ''), "
+        f"{prefix}.name, coalesce({prefix}.description, '')"
+    )
+
+
+def sqlite_statements():
+    yield (
+        "CREATE VIRTUAL TABLE finances_search USING fts5("
+        "owner, name, description, tokenize = 'unicode61 remove_diacritics 2', "
+        # Short prefixes of as-you-type searches read their own index
+        "prefix = '2 3')"
+    )
+    for code, table in TABLES.items():
+        yield (
+            f'CREATE TRIGGER {table}_search_insert AFTER INSERT ON {table} BEGIN '
+            f'INSERT INTO finances_search (rowid, owner, name, description) VALUES ({_fts_row("new", code)}); '
+            'END'
+        )
+        # Balance and amount updates leave the index alone
+        yield (
+            f'CREATE TRIGGER {table}_search_update AFTER UPDATE OF user_id, name, description ON {table} BEGIN '
+            f'DELETE FROM finances_search WHERE rowid = old.id * 4 + {code}; '
+            f'INSERT INTO finances_search (rowid, owner, name, description) VALUES ({_fts_row("new", code)}); '
+            'END'
+        )
+        yield (
+            f'CREATE TRIGGER {table}_search_delete AFTER DELETE ON {table} BEGIN '
+            f'DELETE FROM finances_search WHERE rowid = old.id * 4 + {code}; '
+            'END'
+        )
+        yield (
+            f'INSERT INTO finances_search (rowid, owner, name, description) '
+            f'SELECT {_fts_row(table, code)} FROM {table}'
+        )
+
+
+def create_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for statement in sqlite_statements():
+            schema_editor.execute(statement)
+    elif vendor == 'postgresql':
+        for table in TABLES.values():
+            schema_editor.execute(f'CREATE INDEX {table}_search_idx ON {table} USING gin (({DOCUMENT_SQL}))')
+
+
+def drop_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for table in TABLES.values():
+            for event in ('insert', 'update', 'delete'):
+                schema_editor.execute(f'DROP TRIGGER {table}_search_{event}')
+        schema_editor.execute('DROP TABLE finances_search')
+    elif vendor == 'postgresql':
+        for table in TABLES.values():
+            schema_editor.execute(f'DROP INDEX {table}_search_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finances', '0012_item_category_history_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
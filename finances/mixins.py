@@ -0,0 +1,174 @@
+import hashlib
+from calendar import timegm
+from decimal import Decimal
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .pagination import CreatedAtCursorPagination
+
+CENT = Decimal('0.01')
+
+
+class RelatedQuerysetMixin:
+    """
+    Let a viewset declare the relations its serializer reads, per action.
+
+    Maps an action name (or 'default') to the relations to join, e.g.
+
+        select_related_fields = {'default': ('category', 'user'), 'destroy': ()}
+
+    and get_queryset() results should be passed through with_related().
+    """
+    select_related_fields = {}
+    prefetch_related_fields = {}
+
+    def _related_for(self, declared):
+        return declared.get(self.action, declared.get('default', ()))
+
+    def with_related(self, queryset):
+        select = self._related_for(self.select_related_fields)
+        prefetch = self._related_for(self.prefetch_related_fields)
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+
+class CursorPaginationMixin:
+    """
+    Let clients opt into keyset pagination per request with
+    `?pagination=cursor`; the links it returns carry a `cursor` parameter.
+    Other requests keep the default page-number pagination.
+    """
+    cursor_pagination_class = CreatedAtCursorPagination
+
+    def uses_cursor_pagination(self):
+        params = self.request.query_params
+        return params.get('pagination') == 'cursor' or 'cursor' in params
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator') and self.uses_cursor_pagination():
+            self._paginator = self.cursor_pagination_class()
+        return super().paginator
+
+
+class ValuesListMixin:
+    """
+    Serve JSON list responses through `values_serializer` (a
+    ValuesSerializer), skipping model instances and per-field serializer
+    calls. The browsable API and every other action keep serializer_class.
+    """
+    values_serializer = None
+
+    def list(self, request, *args, **kwargs):
+        if self.values_serializer is None or not isinstance(request.accepted_renderer, JSONRenderer):
+            return super().list(request, *args, **kwargs)
+        rows = self.values_serializer.rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(self.values_serializer.to_representation(page))
+        return Response(self.values_serializer.to_representation(rows))
+
+
+class ConditionalListMixin:
+    """
+    Answer repeated list polls with 304 Not Modified. The ETag covers the
+    requesting user, the query string, the row count and the latest
+    `updated_at` of the rows and of anything their representation reads,
+    declared like
+
+        last_modified_fields = ('updated_at', 'category__updated_at')
+
+    and is computed with one aggregate query before any row is loaded or
+    serialized. A deleted row changes the count, an edited one the time.
+
+    The same query computes `list_totals`, aggregates over every filtered
+    row (not just the page) returned as `totals` beside the results, e.g.
+
+        list_totals = {'amount': Sum('amount')}
+
+    Keyset pages (CursorPaginationMixin) skip both: the aggregate reads
+    every filtered row, and a cursor page must cost the same however deep
+    the client has scrolled.
+    """
+    last_modified_fields = ('updated_at',)
+    list_totals = {}
+
+    def get_validator_queryset(self):
+        return self.filter_queryset(self.get_queryset())
+
+    def list_validators(self):
+        stamps = self.get_validator_queryset().order_by().aggregate(
+            count=Count('pk', distinct=True),
+            **{f'last_{i}': Max(field) for i, field in enumerate(self.last_modified_fields)},
+            **total_aggregates(self.list_totals),
+        )
+        count = stamps.pop('count')
+        self.totals = totals_block(count, stamps)
+        stamps = {key: stamp for key, stamp in stamps.items() if key.startswith('last_')}
+        last_modified = max((stamp for stamp in stamps.values() if stamp is not None), default=None)
+        user = self.request.user
+        state = (
+            user.pk, getattr(user, 'username', ''), self.request.get_full_path(),
+            self.request.accepted_renderer.format, count, sorted(stamps.items()),
+        )
+        etag = quote_etag(hashlib.md5(repr(state).encode(), usedforsecurity=False).hexdigest())
+        return etag, last_modified, count
+
+    def list(self, request, *args, **kwargs):
+        if getattr(self, 'uses_cursor_pagination', lambda: False)():
+            return super().list(request, *args, **kwargs)
+        etag, last_modified, self.validated_count = self.list_validators()
+        timestamp = timegm(last_modified.utctimetuple()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        return conditional_headers(response, etag, timestamp)
+
+    def paginate_queryset(self, queryset):
+        count = getattr(self, 'validated_count', None)
+        if count is not None:
+            # Page-number pagination would count the same rows again
+            queryset.count = lambda: count
+        return super().paginate_queryset(queryset)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.list_totals and hasattr(self, 'totals'):
+            response.data['totals'] = self.totals
+        return response
+
+
+def total_aggregates(totals):
+    """`totals` aliased apart from the model's fields, which the aggregates are often named after."""
+    return {f'total_{name}': aggregate for name, aggregate in totals.items()}
+
+
+def totals_block(count, row):
+    """
+    The `totals` of a list response from an aggregate `row` containing
+    total_aggregates(). Amounts render like the rows' DecimalFields do,
+    as strings in cents.
+    """
+    block = {'count': count}
+    for key, total in row.items():
+        if key.startswith('total_'):
+            # SQLite sums come back unscaled
+            block[key[len('total_'):]] = str(total.quantize(CENT)) if isinstance(total, Decimal) else total
+    return block
+
+
+def conditional_headers(response, etag, timestamp=None):
+    """Validators plus headers keeping shared caches from serving one user's list to another."""
+    response['ETag'] = etag
+    if timestamp is not None:
+        response['Last-Modified'] = http_date(timestamp)
+    patch_vary_headers(response, ('Authorization',))
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -1,14 +1,34 @@
-from django.db import models
+from django.db import connections, models, transaction, IntegrityError
+from django.db.models import Case, Value, When
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce
 from django.core.validators import MinValueValidator
+from django.utils import timezone
+from datetime import timedelta
 from decimal import Decimal
 from django.contrib.auth.models import User
 
+class CategoryQuerySet(models.QuerySet):
+    def with_totals(self):
+        """
+        Annotate total_amount and items_count from the balance ledger in the
+        same query as the rows. Meta.ordering is ignored by aggregating
+        queries, so it is restated.
+        """
+        return self.annotate(
+            total_amount=Coalesce(Sum('balances__balance'), Decimal('0.00')),
+            items_count=Coalesce(Sum('balances__items_count'), 0),
+        ).order_by(*self.model._meta.ordering)
+
+
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CategoryQuerySet.as_manager()
+
     class Meta:
         verbose_name_plural = "Categories"
         ordering = ['name']
@@ -48,12 +68,87 @@ class Item(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Per-user history, newest first
+            models.Index(fields=['user', '-created_at'], name='item_user_created_idx'),
+            # One category's history, optionally bounded by date (?category=&created_after=)
+            models.Index(fields=['user', 'category', '-created_at'], name='item_user_cat_created_idx'),
+            # FIFO withdrawal from one user's deposits that still hold money, oldest first
+            models.Index(
+                fields=['user', 'category', 'created_at', 'id'],
+                condition=models.Q(current_balance__gt=0),
+                name='item_fifo_idx',
+            ),
+        ]
+
+    # The columns the balance ledger is keyed on, by attname
+    LEDGER_FIELDS = ('user_id', 'category_id', 'current_balance')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Only what was loaded: reading a deferred field here would load it
+        # through refresh_from_db(), which builds another instance here.
+        instance._ledger_state = {
+            name: instance.__dict__[name] for name in cls.LEDGER_FIELDS if name in instance.__dict__
+        }
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        if fields is None:
+            deferred = self.get_deferred_fields()
+            reloaded = [name for name in self.LEDGER_FIELDS if name not in deferred]
+        else:
+            fields = list(fields)
+            reloaded = [
+                field.attname for field in self._meta.concrete_fields
+                if field.attname in self.LEDGER_FIELDS and (field.attname in fields or field.name in fields)
+            ]
+        super().refresh_from_db(using, fields)
+        state = self.__dict__.setdefault('_ledger_state', {})
+        state.update((name, self.__dict__[name]) for name in reloaded)
+
+    def _ledger_key(self):
+        return (self.user_id, self.category_id, self.current_balance)
+
+    def _stored_ledger_key(self):
+        """
+        The ledger key as last loaded or saved, or None for a deposit the
+        ledger has not seen. Fields assigned without ever being loaded are
+        read from the row.
+        """
+        state = getattr(self, '_ledger_state', None)
+        if state is None:
+            return None
+        missing = [name for name in self.LEDGER_FIELDS if name not in state]
+        if missing:
+            stored = type(self)._base_manager.using(self._state.db).filter(pk=self.pk).values(*missing).first()
+            if stored is None:
+                return None
+            state.update(stored)
+        return tuple(state[name] for name in self.LEDGER_FIELDS)
 
     def save(self, *args, **kwargs):
         # On creation, if balance is 0, assume it's a new deposit equal to amount
         if not self.pk and self.current_balance == 0:
             self.current_balance = self.amount
-        super().save(*args, **kwargs)
+
+        # Keep the per-category balance ledger in step with this deposit
+        current = self._ledger_key()
+        previous = self._stored_ledger_key()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if previous != current:
+                kind = Transaction.DEPOSIT
+                if previous is not None:
+                    kind = Transaction.ADJUSTMENT
+                    user_id, category_id, balance = previous
+                    CategoryBalance.objects.adjust(user_id, category_id, -balance, -1)
+                    Transaction.objects.record(user_id, category_id, self.pk, kind, -balance)
+                user_id, category_id, balance = current
+                CategoryBalance.objects.adjust(user_id, category_id, balance, 1)
+                Transaction.objects.record(user_id, category_id, self.pk, kind, balance)
+        self._ledger_state = dict(zip(self.LEDGER_FIELDS, current))
 
     def __str__(self):
         return f"{self.name} - {self.current_balance}/{self.amount} UGX"
@@ -84,6 +179,9 @@ class ToBuy(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='tobuy_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.amount} UGX"
@@ -113,10 +211,384 @@ class Budget(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def total_amount(self):
-        return sum(item.amount for item in self.items.all())
+        """Amount spent in this budget's category during its current period."""
+        Budget.attach_spent([self])
+        return self.spent
+
+    @staticmethod
+    def period_starts(now=None):
+        today = timezone.localtime(now).replace(hour=0, minute=0, second=0, microsecond=0)
+        return {
+            'Daily': today,
+            'Weekly': today - timedelta(days=today.weekday()),
+            'Monthly': today.replace(day=1),
+        }
+
+    @classmethod
+    def attach_spent(cls, budgets, now=None):
+        """
+        Set `period_start`, `spent` and `remaining` on each budget.
+
+        `spent` is what the budget's owner has withdrawn from the budget's
+        category since the start of its current Daily/Weekly/Monthly period
+        (unknown types count as Daily), whichever deposits the withdrawals
+        drew on. It is read from the journal's withdrawal rows, so periods
+        compacted away with `compact_journal --prune` count as unspent. The
+        spend of every (user, category) pair for all three periods comes
+        from one grouped query, however many budgets are passed.
+        """
+        budgets = list(budgets)
+        if not budgets:
+            return budgets
+        starts = cls.period_starts(now)
+        money = models.DecimalField(max_digits=15, decimal_places=2)
+        rows = Transaction.objects.filter(
+            kind=Transaction.WITHDRAWAL,
+            user_id__in={budget.user_id for budget in budgets},
+            category_id__in={budget.category_id for budget in budgets},
+            created_at__gte=min(starts.values()),
+        ).order_by().values('user_id', 'category_id').annotate(**{
+            # Withdrawals are journaled as negative amounts
+            period: Sum(-F('amount'), filter=models.Q(created_at__gte=start), output_field=money)
+            for period, start in starts.items()
+        })
+        spent = {(row['user_id'], row['category_id']): row for row in rows}
+
+        for budget in budgets:
+            period = budget.type if budget.type in starts else 'Daily'
+            budget.period_start = starts[period]
+            row = spent.get((budget.user_id, budget.category_id), {})
+            budget.spent = row.get(period) or Decimal('0.00')
+            budget.remaining = budget.amount - budget.spent
+        return budgets
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='budget_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} - {self.amount} UGX"
+
+
+class CategoryBalanceManager(models.Manager):
+    def adjust(self, user_id, category_id, delta, count_delta=0):
+        """Add `delta` to the balance (and `count_delta` to the deposit count) of one ledger row."""
+        if not delta and not count_delta:
+            return
+        changes = {
+            'balance': F('balance') + delta,
+            'items_count': F('items_count') + count_delta,
+            'updated_at': timezone.now(),
+        }
+        rows = self.filter(user_id=user_id, category_id=category_id)
+        if rows.update(**changes) or delta < 0 or count_delta < 0:
+            # Nothing to take away from a row that doesn't exist (e.g. its
+            # category is being deleted); rebuild() repairs any drift.
+            return
+        try:
+            with transaction.atomic():
+                self.create(user_id=user_id, category_id=category_id,
+                            balance=delta, items_count=count_delta)
+        except IntegrityError:
+            # Another request created the row first
+            rows.update(**changes)
+
+    def total(self, **filters):
+        total = self.filter(**filters).aggregate(total=Sum('balance'))['total'] or Decimal('0.00')
+        # SQLite sums decimals as floats; drop the rounding noise
+        return total.quantize(Decimal('0.01'))
+
+    def locked_total(self, **filters):
+        """total() that also row-locks the ledger rows until the transaction ends."""
+        balances = self.select_for_update().filter(**filters).values_list('balance', flat=True)
+        return sum(balances, Decimal('0.00'))
+
+    def expected(self):
+        """Ledger rows recomputed from the raw items, keyed by (user_id, category_id)."""
+        rows = Item.objects.order_by().values('user_id', 'category_id').annotate(
+            balance=Sum('current_balance'), items_count=Count('id')
+        )
+        return {
+            (row['user_id'], row['category_id']): (row['balance'], row['items_count'])
+            for row in rows
+        }
+
+    def rebuild(self):
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create(
+                CategoryBalance(user_id=user_id, category_id=category_id,
+                                balance=balance, items_count=items_count)
+                for (user_id, category_id), (balance, items_count) in self.expected().items()
+            )
+
+
+class CategoryBalance(models.Model):
+    """Running sum of Item.current_balance per user and category."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name="category_balances"
+    )
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name='balances'
+    )
+    balance = models.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        default=Decimal('0.00')
+    )
+    items_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = CategoryBalanceManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'category'], name='unique_category_balance'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} / {self.category} - {self.balance} UGX"
+
+
+class TransactionManager(models.Manager):
+    def record(self, user_id, category_id, item_id, kind, amount):
+        if amount:
+            entry = self.create(user_id=user_id, category_id=category_id, item_id=item_id, kind=kind, amount=amount)
+            FlowRollup.objects.add(user_id, category_id, kind, amount, entry.created_at)
+
+    def record_withdrawal(self, drained, partial_id, partial_deduction, when):
+        """
+        Journal a FIFO withdrawal with a single INSERT ... SELECT.
+
+        Every deposit in `drained` gives up its whole current balance, except
+        `partial_id`, which gives up `partial_deduction`. Must run before the
+        balances are updated.
+        """
+        money = models.DecimalField(max_digits=15, decimal_places=2)
+        rows = drained.order_by().annotate(
+            journal_kind=Value(self.model.WITHDRAWAL),
+            journal_amount=Case(
+                When(pk=partial_id, then=Value(-partial_deduction)),
+                default=-F('current_balance'),
+                output_field=money,
+            ),
+            journal_at=Value(when, output_field=models.DateTimeField()),
+        ).values_list('user_id', 'category_id', 'id', 'journal_kind', 'journal_amount', 'journal_at')
+        select_sql, params = rows.query.get_compiler(using=drained.db).as_sql()
+
+        connection = connections[drained.db]
+        quote = connection.ops.quote_name
+        columns = ', '.join(
+            quote(self.model._meta.get_field(name).column)
+            for name in ('user', 'category', 'item', 'kind', 'amount', 'created_at')
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {quote(self.model._meta.db_table)} ({columns}) {select_sql}', params
+            )
+
+    def balance_as_of(self, user, category, when):
+        """
+        Balance of `user`'s deposits in `category` at `when`: the latest
+        snapshot taken at or before `when` plus the journal rows after it.
+        """
+        snapshot = BalanceSnapshot.objects.filter(
+            user=user, category=category, as_of__lte=when
+        ).order_by('-as_of').first()
+        tail = self.filter(user=user, category=category, created_at__lte=when)
+        opening = Decimal('0.00')
+        if snapshot is not None:
+            tail = tail.filter(created_at__gt=snapshot.as_of)
+            opening = snapshot.balance
+        total = opening + (tail.aggregate(total=Sum('amount'))['total'] or 0)
+        return total.quantize(Decimal('0.01'))
+
+
+class Transaction(models.Model):
+    """
+    Append-only journal of every change to a deposit's balance.
+
+    Rows are never updated. The foreign keys carry no database constraint
+    and are left alone on delete, so the history of deleted items,
+    categories and users stays intact.
+    """
+    DEPOSIT = 'deposit'
+    WITHDRAWAL = 'withdrawal'
+    ADJUSTMENT = 'adjustment'
+    KIND_CHOICES = [
+        (DEPOSIT, 'Deposit'),
+        (WITHDRAWAL, 'Withdrawal'),
+        (ADJUSTMENT, 'Adjustment'),
+    ]
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        blank=True,
+        null=True,
+        related_name="transactions"
+    )
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='transactions'
+    )
+    item = models.ForeignKey(
+        Item,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        blank=True,
+        null=True,
+        related_name='transactions'
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    # Signed: deposits are positive, withdrawals negative
+    amount = models.DecimalField(max_digits=15, decimal_places=2)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    objects = TransactionManager()
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'category', 'created_at'], name='journal_user_cat_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.amount} UGX"
+
+
+class BalanceSnapshot(models.Model):
+    """Balance of one user's deposits in one category at `as_of`, compacted from the journal."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name="balance_snapshots"
+    )
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name='snapshots'
+    )
+    as_of = models.DateTimeField()
+    balance = models.DecimalField(max_digits=15, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-as_of']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'category', 'as_of'], name='unique_balance_snapshot'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} / {self.category} @ {self.as_of} - {self.balance} UGX"
+
+
+class FlowRollupManager(models.Manager):
+    @staticmethod
+    def buckets(when):
+        """Start date of the day, week (Monday) and month containing `when`."""
+        day = timezone.localtime(when).date()
+        return {
+            FlowRollup.DAY: day,
+            FlowRollup.WEEK: day - timedelta(days=day.weekday()),
+            FlowRollup.MONTH: day.replace(day=1),
+        }
+
+    @staticmethod
+    def changes(kind, amount):
+        """Column increments for one journal amount of `kind`."""
+        if kind == Transaction.DEPOSIT:
+            return {'deposits': amount}
+        if kind == Transaction.WITHDRAWAL:
+            return {'withdrawals': -amount}
+        return {'adjustments': amount}
+
+    def add(self, user_id, category_id, kind, amount, when):
+        """Fold one journal amount into the day, week and month rollups containing `when`."""
+        if not amount:
+            return
+        buckets = self.buckets(when)
+        changes = self.changes(kind, amount)
+        increments = {column: F(column) + value for column, value in changes.items()}
+        rows = self.filter(user_id=user_id, category_id=category_id).filter(
+            models.Q(period=FlowRollup.DAY, bucket=buckets[FlowRollup.DAY])
+            | models.Q(period=FlowRollup.WEEK, bucket=buckets[FlowRollup.WEEK])
+            | models.Q(period=FlowRollup.MONTH, bucket=buckets[FlowRollup.MONTH])
+        )
+        # Usually all three rows exist and this is a single UPDATE
+        if rows.update(**increments) == len(buckets):
+            return
+        existing = set(rows.values_list('period', 'bucket'))
+        for period, bucket in buckets.items():
+            if (period, bucket) in existing:
+                continue
+            try:
+                with transaction.atomic():
+                    self.create(user_id=user_id, category_id=category_id,
+                                period=period, bucket=bucket, **changes)
+            except IntegrityError:
+                # Another request created the row first
+                self.filter(user_id=user_id, category_id=category_id,
+                            period=period, bucket=bucket).update(**increments)
+
+
+class FlowRollup(models.Model):
+    """Deposits, withdrawals and adjustments of one user in one category per day, week or month."""
+    DAY = 'day'
+    WEEK = 'week'
+    MONTH = 'month'
+    PERIOD_CHOICES = [
+        (DAY, 'Day'),
+        (WEEK, 'Week'),
+        (MONTH, 'Month'),
+    ]
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name="flow_rollups"
+    )
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name='flow_rollups'
+    )
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES)
+    # First day of the bucket
+    bucket = models.DateField()
+    deposits = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    withdrawals = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    adjustments = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+
+    objects = FlowRollupManager()
+
+    class Meta:
+        ordering = ['bucket']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'period', 'bucket', 'category'], name='unique_flow_rollup'
+            ),
+        ]
+
+    @property
+    def net(self):
+        return self.deposits - self.withdrawals + self.adjustments
 
     def __str__(self):
-        return f"{self.name} - {self.amount} UGX"
\ No newline at end of file
+        return f"{self.user} / {self.category} {self.period} {self.bucket}"
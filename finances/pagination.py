@@ -0,0 +1,63 @@
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Keyset pagination over (created_at, id), newest first.
+
+    Each page is a `created_at < position` range read off the per-user
+    (user, created_at) indexes, so no OFFSET scan or COUNT(*) is needed
+    however far back a client pages. `id` keeps the order stable between
+    rows created in the same instant.
+    """
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+def estimated_count(queryset):
+    """
+    The row count of `queryset`'s table from the database's statistics, or
+    None when the queryset is filtered or no statistics exist. SQLite keeps
+    them in sqlite_stat1 once ANALYZE (or PRAGMA optimize) has run.
+    """
+    if queryset.query.where:
+        return None
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                # One row per index, led by the rows it covers; partial indexes
+                # cover fewer, so take the largest. CAST keeps the leading number.
+                cursor.execute('SELECT MAX(CAST(stat AS INTEGER)) FROM sqlite_stat1 WHERE tbl = %s', [table])
+                return cursor.fetchone()[0]
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+                row = cursor.fetchone()
+                # -1 until the table is first analyzed
+                return row[0] if row and row[0] >= 0 else None
+    except DatabaseError:
+        # e.g. sqlite_stat1 doesn't exist before the first ANALYZE
+        return None
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for admin changelists of large tables. An unfiltered list of
+    at least `estimate_threshold` rows is counted from the table statistics
+    instead of with COUNT(*), which reads the whole table; page counts are
+    then approximate. Filtered lists and small tables are counted exactly.
+    """
+    estimate_threshold = 100000
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is None or estimate < self.estimate_threshold:
+            return super().count
+        return estimate
@@ -0,0 +1,82 @@
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = 'replica'
+
+# The request being handled in this thread or task, set by ReplicaRoutingMiddleware
+current_request = ContextVar('current_request', default=None)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def sticky_key(user_id):
+    return f'finances:primary:{user_id}'
+
+
+def mark_sticky(user_id):
+    """Read from the primary for the next few seconds, until the replica has this user's writes."""
+    cache.set(sticky_key(user_id), True, settings.REPLICA_STICKY_SECONDS)
+
+
+def replica_configured():
+    if REPLICA not in connections.settings:
+        return False
+    # Under test the replica mirrors the primary's test database
+    if connections[REPLICA].settings_dict['NAME'] == connections[DEFAULT_DB_ALIAS].settings_dict['NAME']:
+        return False
+    if isinstance(caches['default'], LocMemCache):
+        # A sticky flag set by one process would keep the others on the replica
+        raise ImproperlyConfigured(
+            'A read replica needs a cache shared by every server process; set CACHE_BACKEND.'
+        )
+    return True
+
+
+def reads_from_replica(request):
+    if request.method not in SAFE_METHODS:
+        return False
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        # Not known yet (DRF authenticates inside the view) or anonymous
+        return True
+    if getattr(request, '_sticky_user_id', None) != user.pk:
+        request._sticky_user_id = user.pk
+        request._sticky = cache.get(sticky_key(user.pk)) is not None
+    return not request._sticky
+
+
+class ReplicaRouter:
+    """
+    Sends reads of finances models made while serving a safe request to the
+    `replica` database, unless the requesting user wrote something in the
+    last REPLICA_STICKY_SECONDS. Everything else - writes, withdrawals and
+    reads outside a request - uses the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != 'finances' or not replica_configured():
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # Follow relations on the database the instance came from
+            return instance._state.db
+        request = current_request.get()
+        if request is None or not reads_from_replica(request):
+            return DEFAULT_DB_ALIAS
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both databases hold the same rows
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # The replica is a copy of the primary, schema included
+        return db != REPLICA
@@ -0,0 +1,219 @@
+"""
+Full-text search over the names and descriptions of items, budgets and
+to-buy entries.
+
+On SQLite the documents live in the `finances_search` FTS5 table, kept in
+step with the three tables by triggers (see migration 0013). A document's
+rowid is its row's id * 4 plus the kind's code below, so each trigger
+touches its document by rowid. The `owner` column holds 'u<user id>' and
+scopes a search to one user inside the index.
+
+SQLite's schema editor rebuilds a table for most AlterField and
+RemoveField operations, which drops its triggers without an error.
+Migrations on these tables must keep the triggers: restore_triggers()
+runs after every migrate and re-creates missing ones, reindexing what was
+written while they were gone.
+
+On PostgreSQL each table has a GIN index over DOCUMENT_SQL, which is
+always current and needs no triggers. Other backends fall back to
+case-insensitive LIKE.
+"""
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Budget, Item, ToBuy
+
+# kind -> (model, rowid code)
+KINDS = {
+    'item': (Item, 1),
+    'budget': (Budget, 2),
+    'to_buy': (ToBuy, 3),
+}
+
+FTS_TABLE = 'finances_search'
+
+# Must match the indexed expression exactly for PostgreSQL to use the index
+DOCUMENT_SQL = (
+    "setweight(to_tsvector('simple', name), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'B')"
+)
+
+# bm25() weights for the owner, name and description columns
+FTS_WEIGHTS = (0.0, 10.0, 1.0)
+
+MAX_TERMS = 8
+
+
+def terms(query):
+    """The words of `query`, lowercased; punctuation and search operators are dropped."""
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+def _fts_match(words, user_id=None):
+    # Every word in the name or description, the last one possibly unfinished
+    *whole, last = words
+    match = '{name description} : (%s)' % ' AND '.join([*(f'"{word}"' for word in whole), f'"{last}"*'])
+    if user_id is not None:
+        match = f'owner : "u{user_id}" AND {match}'
+    return match
+
+
+def _tsquery(words):
+    *whole, last = words
+    return ' & '.join([*whole, f'{last}:*'])
+
+
+def _fts_row(prefix, code):
+    return (
+        f"{prefix}.id * 4 + {code}, 'u' || coalesce({prefix}.user_id, ''), "
+        f"{prefix}.name, coalesce({prefix}.description, '')"
+    )
+
+
+def sqlite_triggers():
+    """(name, CREATE TRIGGER statement) of each trigger keeping FTS_TABLE current, as in migration 0013."""
+    for model, code in KINDS.values():
+        table = model._meta.db_table
+        yield f'{table}_search_insert', (
+            f'CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} BEGIN '
+            f'INSERT INTO {FTS_TABLE} (rowid, owner, name, description) VALUES ({_fts_row("new", code)}); '
+            'END'
+        )
+        # Balance and amount updates leave the index alone
+        yield f'{table}_search_update', (
+            f'CREATE TRIGGER IF NOT EXISTS {table}_search_update '
+            f'AFTER UPDATE OF user_id, name, description ON {table} BEGIN '
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = old.id * 4 + {code}; '
+            f'INSERT INTO {FTS_TABLE} (rowid, owner, name, description) VALUES ({_fts_row("new", code)}); '
+            'END'
+        )
+        yield f'{table}_search_delete', (
+            f'CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} BEGIN '
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = old.id * 4 + {code}; '
+            'END'
+        )
+
+
+def restore_triggers(using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    post_migrate handler: re-create the triggers a table rebuild dropped
+    and reindex every document, as rows may have changed in between.
+    Nothing to do once they all exist, or before migration 0013.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+        existing = {name for name, in cursor.fetchall()}
+        missing = [sql for name, sql in sqlite_triggers() if name not in existing]
+        if FTS_TABLE not in existing or not missing:
+            return
+        with transaction.atomic(using):
+            for sql in missing:
+                cursor.execute(sql)
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            for model, code in KINDS.values():
+                table = model._meta.db_table
+                cursor.execute(
+                    f'INSERT INTO {FTS_TABLE} (rowid, owner, name, description) '
+                    f'SELECT {_fts_row(table, code)} FROM {table}'
+                )
+
+
+def _connection(model):
+    return connections[router.db_for_read(model)]
+
+
+def matching(queryset, query):
+    """`queryset` narrowed to rows matching `query`, as in search()."""
+    words = terms(query)
+    if not words:
+        return queryset.none()
+    model = queryset.model
+    kind = next(kind for kind, (kind_model, _) in KINDS.items() if kind_model is model)
+    vendor = connections[queryset.db].vendor
+    if vendor == 'sqlite':
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid / 4 FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid %% 4 = %s',
+            [_fts_match(words), KINDS[kind][1]],
+        ))
+    if vendor == 'postgresql':
+        return queryset.filter(pk__in=RawSQL(
+            f"SELECT id FROM {model._meta.db_table} WHERE {DOCUMENT_SQL} @@ to_tsquery('simple', %s)",
+            [_tsquery(words)],
+        ))
+    return queryset.filter(_like(words))
+
+
+def _like(words):
+    condition = Q()
+    for word in words:
+        condition &= Q(name__icontains=word) | Q(description__icontains=word)
+    return condition
+
+
+def search(user, query, kinds=tuple(KINDS), limit=20):
+    """
+    The best `limit` matches of `query` among `user`'s rows of `kinds`, as
+    (kind, id, score) with the highest score first. A row matches when its
+    name or description contains every word of `query`, the last as a
+    prefix so that a query can be typed out; name matches rank above
+    description matches.
+    """
+    words = terms(query)
+    if not words:
+        return []
+    connection = _connection(Item)
+    if connection.vendor == 'sqlite':
+        return _search_fts(connection, user, words, kinds, limit)
+    if connection.vendor == 'postgresql':
+        return _search_tsvector(connection, user, words, kinds, limit)
+    return _search_like(user, words, kinds, limit)
+
+
+def _search_fts(connection, user, words, kinds, limit):
+    codes = {code: kind for kind, (_, code) in KINDS.items() if kind in kinds}
+    where = f'{FTS_TABLE} MATCH %s'
+    params = [*FTS_WEIGHTS, _fts_match(words, user.pk)]
+    if len(codes) < len(KINDS):
+        # Checked on every match, so left out when all kinds are wanted
+        where += f' AND rowid %% 4 IN ({", ".join("%s" for _ in codes)})'
+        params += codes
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid, bm25({FTS_TABLE}, %s, %s, %s) AS rank FROM {FTS_TABLE} '
+            f'WHERE {where} ORDER BY rank LIMIT %s',
+            [*params, limit],
+        )
+        # bm25() is lower for better matches
+        return [(codes[rowid % 4], rowid // 4, -rank) for rowid, rank in cursor.fetchall()]
+
+
+def _search_tsvector(connection, user, words, kinds, limit):
+    selects = []
+    params = []
+    for kind in kinds:
+        table = KINDS[kind][0]._meta.db_table
+        selects.append(
+            f'SELECT %s AS kind, id, ts_rank({DOCUMENT_SQL}, query) AS rank '
+            f"FROM {table}, to_tsquery('simple', %s) query "
+            f'WHERE user_id = %s AND {DOCUMENT_SQL} @@ query'
+        )
+        params += [kind, _tsquery(words), user.pk]
+    with connection.cursor() as cursor:
+        cursor.execute(f'{" UNION ALL ".join(selects)} ORDER BY rank DESC, id DESC LIMIT %s', [*params, limit])
+        return [(kind, pk, rank) for kind, pk, rank in cursor.fetchall()]
+
+
+def _search_like(user, words, kinds, limit):
+    hits = []
+    for kind in kinds:
+        rows = KINDS[kind][0].objects.filter(_like(words), user=user).values_list('id', 'created_at')
+        hits += [(created_at, kind, pk) for pk, created_at in rows.order_by('-created_at')[:limit]]
+    # Unranked; newest first
+    hits.sort(key=lambda hit: hit[0], reverse=True)
+    return [(kind, pk, 0.0) for _, kind, pk in hits[:limit]]
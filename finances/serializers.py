@@ -1,8 +1,15 @@
-from rest_framework import serializers
-from .models import Category, Item, Budget, ToBuy
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from django.utils.functional import cached_property
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+from . import hashing
+from .models import Category, CategoryBalance, Item, Budget, ToBuy
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
-from django.db.models import Sum
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(
@@ -28,11 +35,13 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         validated_data.pop('password2')
-        user = User.objects.create_user(
-            username=validated_data['username'],
-            email=validated_data['email'],
-            password=validated_data['password']
+        # As create_user(), with the password hashed in the hashing pool
+        user = User(
+            username=User.normalize_username(validated_data['username']),
+            email=User.objects.normalize_email(validated_data['email']),
+            password=hashing.make_password(validated_data['password']),
         )
+        user.save()
         return user
 
 
@@ -45,7 +54,7 @@ class UserSerializer(serializers.ModelSerializer):
 class CategorySerializer(serializers.ModelSerializer):
     # We use a method field to ensure we sum the CURRENT AVAILABLE balance, not the history
     total_amount = serializers.SerializerMethodField()
-    items_count = serializers.IntegerField(source='itemsItem.count', read_only=True)
+    items_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Category
@@ -54,22 +63,35 @@ class CategorySerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
 
     def get_total_amount(self, obj):
-        # Sums up the 'current_balance' of all items in this category
-        total = obj.itemsItem.aggregate(sum=Sum('current_balance'))['sum']
-        return total if total is not None else 0.00
+        # Sums up the 'current_balance' of all items in this category, as kept by the ledger.
+        # CategoryViewSet annotates it on the queryset so no per-row query is needed.
+        if hasattr(obj, 'total_amount'):
+            return obj.total_amount
+        return CategoryBalance.objects.total(category=obj)
+
+    def get_items_count(self, obj):
+        if hasattr(obj, 'items_count'):
+            return obj.items_count
+        return obj.itemsItem.count()
 
 
 class CategoryListSerializer(serializers.ModelSerializer):
     total_amount = serializers.SerializerMethodField()
-    items_count = serializers.IntegerField(source='itemsItem.count', read_only=True)
+    items_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Category
         fields = ['id', 'name', 'description', 'total_amount', 'items_count']
 
     def get_total_amount(self, obj):
-        total = obj.itemsItem.aggregate(sum=Sum('current_balance'))['sum']
-        return total if total is not None else 0.00
+        if hasattr(obj, 'total_amount'):
+            return obj.total_amount
+        return CategoryBalance.objects.total(category=obj)
+
+    def get_items_count(self, obj):
+        if hasattr(obj, 'items_count'):
+            return obj.items_count
+        return obj.itemsItem.count()
 
 
 class ItemSerializer(serializers.ModelSerializer):
@@ -99,6 +121,16 @@ class BudgetSerializer(serializers.ModelSerializer):
         read_only_fields = ['user', 'created_at', 'updated_at']
 
 
+class BudgetVsActualSerializer(BudgetSerializer):
+    # Set by Budget.attach_spent()
+    period_start = serializers.DateTimeField(read_only=True)
+    spent = serializers.DecimalField(max_digits=15, decimal_places=2, read_only=True)
+    remaining = serializers.DecimalField(max_digits=15, decimal_places=2, read_only=True)
+
+    class Meta(BudgetSerializer.Meta):
+        fields = BudgetSerializer.Meta.fields + ['period_start', 'spent', 'remaining']
+
+
 class ToBuySerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     user_name = serializers.CharField(source='user.username', read_only=True)
@@ -107,4 +139,79 @@ class ToBuySerializer(serializers.ModelSerializer):
         model = ToBuy
         fields = ['id', 'name', 'category', 'category_name', 'amount', 
                   'description', 'user', 'user_name', 'created_at', 'updated_at']
-        read_only_fields = ['user', 'created_at', 'updated_at']
\ No newline at end of file
+        read_only_fields = ['user', 'created_at', 'updated_at']
+
+class ValuesSerializer:
+    """
+    Read-only list serialization for `serializer_class` from .values_list()
+    rows instead of model instances, giving the same output as
+    serializer_class(queryset, many=True).data. Columns are derived from the
+    serializer's fields; SerializerMethodFields read a queryset annotation
+    of the same name.
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+
+    @cached_property
+    def columns(self):
+        lookups = []
+
+        def index(lookup):
+            if lookup not in lookups:
+                lookups.append(lookup)
+            return lookups.index(lookup)
+
+        columns = []
+        for name, field in self.serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.SerializerMethodField):
+                source = name
+            else:
+                source = field.source
+            path = source.split('.')
+            # DRF leaves the key out when a relation on the way is null
+            guard = index(path[0]) if len(path) > 1 else None
+            columns.append((name, index('__'.join(path)), self.converter(field), guard))
+        return lookups, columns
+
+    @staticmethod
+    def converter(field):
+        """Function turning a non-null column value into field's representation, or None if it is already."""
+        if isinstance(field, serializers.DecimalField):
+            quantum = Decimal(1).scaleb(-field.decimal_places) if field.decimal_places is not None else None
+            return lambda value: f'{value.quantize(quantum) if quantum else value:f}'
+        if isinstance(field, serializers.DateTimeField):
+            if (getattr(field, 'format', api_settings.DATETIME_FORMAT) == ISO_8601
+                    and not hasattr(field, 'timezone') and settings.USE_TZ):
+                # What DateTimeField.to_representation does for aware ISO 8601 output
+                def iso_8601(value):
+                    value = value.astimezone(timezone.get_current_timezone()).isoformat()
+                    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+                return iso_8601
+            return field.to_representation
+        if isinstance(field, serializers.ChoiceField):
+            return lambda value: field.choice_strings_to_values.get(str(value), value)
+        if isinstance(field, (serializers.CharField, serializers.IntegerField,
+                              serializers.PrimaryKeyRelatedField, serializers.SerializerMethodField)):
+            # Already a str, int, pk or plain value
+            return None
+        raise ImproperlyConfigured(f'{type(field).__name__} {field.field_name!r} has no values() representation')
+
+    def rows(self, queryset):
+        """Row tuples for to_representation(), with attribute access for cursor pagination."""
+        return queryset.values_list(*self.columns[0], named=True)
+
+    def to_representation(self, rows):
+        columns = self.columns[1]
+        data = []
+        for row in rows:
+            item = {}
+            for name, index, convert, guard in columns:
+                if guard is not None and row[guard] is None:
+                    continue
+                value = row[index]
+                item[name] = value if convert is None or value is None else convert(value)
+            data.append(item)
+        return data
@@ -0,0 +1,57 @@
+from django.db.models import QuerySet
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .authentication import CLAIM_FIELDS, revoke_tokens, user_cache
+from .models import Budget, CategoryBalance, Item, ToBuy, Transaction
+from .summary import invalidate_summary
+
+
+@receiver(post_delete, sender=Item)
+def remove_item_from_ledger(sender, instance, origin=None, **kwargs):
+    # Fires for instance, queryset and cascade deletes alike. When the item
+    # goes because its category or user does, their ledger rows and rollups
+    # are deleted too and must not be written back.
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if origin is not None and origin_model is not Item:
+        return
+    CategoryBalance.objects.adjust(
+        instance.user_id, instance.category_id, -instance.current_balance, -1
+    )
+    Transaction.objects.record(
+        instance.user_id, instance.category_id, instance.pk,
+        Transaction.ADJUSTMENT, -instance.current_balance
+    )
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_save, sender=Budget)
+@receiver(post_save, sender=ToBuy)
+@receiver(post_delete, sender=Item)
+@receiver(post_delete, sender=Budget)
+@receiver(post_delete, sender=ToBuy)
+def invalidate_user_summary(sender, instance, **kwargs):
+    invalidate_summary(instance.user_id)
+
+
+@receiver(pre_save, sender=User)
+def revoke_stale_tokens(sender, instance, update_fields=None, **kwargs):
+    # Stateless tokens carry these fields and skip the is_active and password checks
+    watched = {'password', 'is_active', *CLAIM_FIELDS}
+    if instance._state.adding or (update_fields is not None and not watched & set(update_fields)):
+        return
+    previous = User.objects.filter(pk=instance.pk).values(*watched).first()
+    if previous and any(previous[field] != getattr(instance, field) for field in watched):
+        revoke_tokens(instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    user_cache.forget(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def revoke_deleted_user_tokens(sender, instance, **kwargs):
+    revoke_tokens(instance.pk)
@@ -0,0 +1,98 @@
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.utils.http import quote_etag
+
+from .models import Budget, CategoryBalance, Item, ToBuy
+
+ZERO = Decimal('0.00')
+
+
+def cache_key(user_id):
+    return f'finances:summary:{user_id}'
+
+
+def build_summary(user):
+    """
+    Dashboard totals for `user`: per-category balances and to-buy totals,
+    and each budget against its spend over its own Daily/Weekly/Monthly
+    period (see Budget.attach_spent).
+    """
+    categories = {}
+
+    def category_row(category_id, name):
+        return categories.setdefault(category_id, {
+            'id': category_id,
+            'name': name,
+            'balance': ZERO,
+            'items_count': 0,
+            'spent': ZERO,
+            'to_buy': ZERO,
+            'to_buy_count': 0,
+        })
+
+    for row in CategoryBalance.objects.filter(user=user).values(
+        'category_id', 'category__name', 'balance', 'items_count'
+    ):
+        entry = category_row(row['category_id'], row['category__name'])
+        entry['balance'] = row['balance']
+        entry['items_count'] = row['items_count']
+
+    # What has been drawn from the category's deposits so far
+    for row in Item.objects.filter(user=user).order_by().values('category_id', 'category__name').annotate(
+        spent=Sum(F('amount') - F('current_balance'))
+    ):
+        category_row(row['category_id'], row['category__name'])['spent'] = row['spent'] or ZERO
+
+    budgets = [
+        {
+            'id': budget.id,
+            'name': budget.name,
+            'category': budget.category_id,
+            'category_name': budget.category.name,
+            'type': budget.type,
+            'amount': budget.amount,
+            'period_start': budget.period_start,
+            'spent': budget.spent,
+            'remaining': budget.remaining,
+        }
+        for budget in Budget.attach_spent(
+            Budget.objects.filter(user=user).select_related('category').order_by('category__name', 'name', 'id')
+        )
+    ]
+
+    for row in ToBuy.objects.filter(user=user).order_by().values('category_id', 'category__name').annotate(
+        total=Sum('amount'), count=Count('id')
+    ):
+        entry = category_row(row['category_id'], row['category__name'])
+        entry['to_buy'] = row['total']
+        entry['to_buy_count'] = row['count']
+
+    rows = sorted(categories.values(), key=lambda entry: entry['name'])
+    return {
+        'total_assets': sum((entry['balance'] for entry in rows), ZERO),
+        'total_spent': sum((entry['spent'] for entry in rows), ZERO),
+        'total_to_buy': sum((entry['to_buy'] for entry in rows), ZERO),
+        'categories': rows,
+        'budgets': budgets,
+    }
+
+
+def cached_summary(user):
+    """(etag, summary) of `user`; the ETag is new each time the summary is rebuilt."""
+    key = cache_key(user.pk)
+    entry = cache.get(key)
+    if entry is None:
+        entry = (quote_etag(uuid.uuid4().hex), build_summary(user))
+        cache.set(key, entry, settings.SUMMARY_CACHE_TIMEOUT)
+    return entry
+
+
+def invalidate_summary(user_id):
+    """Drop the cached summary of one user once the current transaction commits."""
+    if user_id is not None:
+        transaction.on_commit(lambda: cache.delete(cache_key(user_id)))
@@ -0,0 +1,33 @@
+from contextlib import contextmanager
+
+from django.db import transaction
+
+
+@contextmanager
+def write_transaction(using=None):
+    """
+    transaction.atomic() that holds the write lock from its first statement.
+
+    SQLite starts atomic blocks with a deferred BEGIN, so two requests can
+    both read the same balance before either writes. BEGIN IMMEDIATE makes
+    the second one wait for the first to commit before it reads anything.
+    Other backends get a plain atomic block; callers lock the rows they
+    depend on with select_for_update().
+    """
+    connection = transaction.get_connection(using)
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        with transaction.atomic(using=using):
+            yield
+        return
+
+    def begin_immediate():
+        connection.cursor().execute('BEGIN IMMEDIATE')
+
+    # Shadow the backend's BEGIN for this one outermost block only
+    connection._start_transaction_under_autocommit = begin_immediate
+    try:
+        with transaction.atomic(using=using):
+            del connection._start_transaction_under_autocommit
+            yield
+    finally:
+        connection.__dict__.pop('_start_transaction_under_autocommit', None)
@@ -1,19 +1,35 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CategoryViewSet, ItemViewSet, BudgetViewSet, register_user, login_user, get_user_profile
+from .views import CategoryViewSet, ItemViewSet, BudgetViewSet, ToBuyViewSet, bulk_import, export_ledger, summary, analytics, search, health, batch, register_user, login_user, get_user_profile
 from . import views
+from . import async_views
 from rest_framework_simplejwt.views import TokenRefreshView
 
 router = DefaultRouter()
 router.register(r'categories', CategoryViewSet, basename='category')
 router.register(r'items', ItemViewSet, basename='item')
 router.register(r'budgets', BudgetViewSet, basename='budget')  
+router.register(r'to-buy', ToBuyViewSet, basename='tobuy')
 
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('import/<str:kind>/', bulk_import, name='bulk-import'),
+    path('export/<str:fmt>/', export_ledger, name='export-ledger'),
+    path('summary/', summary, name='summary'),
+    path('analytics/<str:period>/', analytics, name='analytics'),
+    path('search/', search, name='search'),
+    path('health/', health, name='health'),
+    path('batch/', batch, name='batch'),
     path('auth/register/', register_user, name='register'),
     path('auth/login/', login_user, name='login'),
     path('auth/profile/', get_user_profile, name='profile'),
     path('auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+
+    # Async read endpoints, for ASGI deployments
+    path('async/categories/', async_views.category_list, name='async-category-list'),
+    path('async/categories/total_assets/', async_views.total_assets, name='async-total-assets'),
+    path('async/items/', async_views.item_list, name='async-item-list'),
+    path('async/auth/profile/', async_views.profile, name='async-profile'),
+    path('async/summary/', async_views.summary, name='async-summary'),
 ]
\ No newline at end of file
@@ -1,20 +1,24 @@
-from django.shortcuts import render, redirect, get_object_or_404
-from django.db.models import Sum
-from django.db import transaction # Import transaction for safe updates
+from django.shortcuts import render
+from datetime import datetime, time, timedelta
 from decimal import Decimal
+from django.conf import settings
 from django.contrib.auth import authenticate, login
+from django.db import DatabaseError, connection
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_date, parse_datetime
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.csrf import csrf_protect
 
 # DRF Imports
 from rest_framework import viewsets, status
-from rest_framework.decorators import api_view, permission_classes, action
+from rest_framework.decorators import api_view, permission_classes, parser_classes, throttle_classes, action
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
 
 # Import your models
-from .models import Category, Item, Budget, ToBuy
+from .models import Category, CategoryBalance, FlowRollup, Item, Budget, ToBuy, Transaction
 
 # Import your serializers
 from .serializers import (
@@ -23,8 +27,24 @@ from .serializers import (
     CategorySerializer, 
     CategoryListSerializer, 
     ItemSerializer,
-    BudgetSerializer
+    BudgetSerializer,
+    BudgetVsActualSerializer,
+    ToBuySerializer,
+    ValuesSerializer,
 )
+from .authentication import ClaimsRefreshToken, full_user
+from .batch import run_batch, validate as validate_batch
+from .exports import FORMATS as EXPORT_FORMATS, ledger_rows
+from .filters import ITEM_TOTALS, ItemFilter, StableOrderingFilter
+from .imports import IMPORTERS, csv_rows, import_rows
+from .mixins import (
+    ConditionalListMixin, CursorPaginationMixin, RelatedQuerysetMixin, ValuesListMixin, conditional_headers
+)
+from .search import KINDS as SEARCH_KINDS, search as search_rows, terms as search_terms
+from .summary import cached_summary
+from .throttles import LoginIPThrottle, LoginUsernameThrottle
+from .transactions import write_transaction
+from .withdrawals import InsufficientFunds, fifo_withdraw, purchase
 
 # ==========================================
 # 1. HTML/TEMPLATE VIEWS
@@ -58,53 +78,37 @@ def item_view(request):
 def category_view(request):
     categories = Category.objects.all()
     # Calculate total current balance of assets
-    total_assets = Item.objects.filter(user=request.user).aggregate(total=Sum('current_balance'))['total'] or 0
+    total_assets = CategoryBalance.objects.total(user=request.user)
     context = {'categories': categories, 'total_assets': total_assets}
     return render(request, 'category.html', context)
 
 @login_required(login_url='/auth/login/')
-@csrf_protect
 def to_buy_view(request):
-    if request.method == 'POST':
-        name = request.POST.get('name')
-        amount = request.POST.get('amount')
-        category_id = request.POST.get('category') 
-        
-        if name and amount and category_id:
-            category = get_object_or_404(Category, id=category_id)
-            
-            ToBuy.objects.create(
-                user=request.user,
-                name=name,
-                amount=amount,
-                category=category,
-                description=request.POST.get('description', '')
-            )
-            return redirect('to-buy') 
-
-    items_to_buy = ToBuy.objects.filter(user=request.user).order_by('-created_at')
-    categories = Category.objects.all() 
-    
-    context = {
-        'items_to_buy': items_to_buy,
-        'categories': categories
-    }
-    return render(request, 'to_buy.html', context)
-
-@login_required(login_url='/auth/login/')
-def delete_to_buy(request, pk):
-    item = get_object_or_404(ToBuy, pk=pk, user=request.user)
-    item.delete()
-    return redirect('to-buy')
+    # The list, adding and buying go through /api/to-buy/ from the page
+    categories = Category.objects.all()
+    return render(request, 'to_buy.html', {'categories': categories})
 
 
 # ==========================================
 # 2. DRF API VIEWSETS
 # ==========================================
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(ConditionalListMixin, ValuesListMixin, viewsets.ModelViewSet):
     permission_classes = [AllowAny]
     queryset = Category.objects.all()
+    # The list shows totals kept in the ledger rows
+    last_modified_fields = ('updated_at', 'balances__updated_at')
+    values_serializer = ValuesSerializer(CategoryListSerializer)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            # Totals and counts come from the ledger in the same query as the rows
+            queryset = queryset.with_totals()
+        return queryset
+
+    def get_validator_queryset(self):
+        return Category.objects.all()
     
     def get_serializer_class(self):
         if self.action == 'list':
@@ -113,7 +117,7 @@ class CategoryViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def total_assets(self, request):
-        total = Item.objects.aggregate(total=Sum('current_balance'))['total'] or 0
+        total = CategoryBalance.objects.total()
         return Response({'total_assets': total})
 
     # --- NEW: WITHDRAW LOGIC (FIFO) ---
@@ -129,40 +133,21 @@ class CategoryViewSet(viewsets.ModelViewSet):
         if withdraw_amount <= 0:
             return Response({"error": "Amount must be positive"}, status=400)
 
-        # 1. Calculate Total Available Funds in this Category
-        total_available = category.itemsItem.aggregate(sum=Sum('current_balance'))['sum'] or Decimal('0.00')
-
-        if withdraw_amount > total_available:
-            return Response({
-                "error": f"Insufficient funds. Available: {total_available}, Requested: {withdraw_amount}"
-            }, status=400)
-
-        # 2. FIFO Strategy: Get items with balance > 0, oldest first
-        items = category.itemsItem.filter(current_balance__gt=0).order_by('created_at')
+        # One short write transaction, scoped to the caller's own deposits:
+        # lock their ledger row, check the funds, then drain FIFO
+        with write_transaction():
+            # 1. Calculate Total Available Funds in this Category
+            total_available = CategoryBalance.objects.locked_total(user=request.user, category=category)
 
-        remaining_to_withdraw = withdraw_amount
-        affected_items = []
+            if withdraw_amount > total_available:
+                return Response({
+                    "error": f"Insufficient funds. Available: {total_available}, Requested: {withdraw_amount}"
+                }, status=400)
 
-        # 3. Atomic Transaction
-        with transaction.atomic():
-            for item in items:
-                if remaining_to_withdraw <= 0:
-                    break
-
-                # Take from item: min(what's in item, what we need)
-                deduction = min(item.current_balance, remaining_to_withdraw)
-
-                item.current_balance -= deduction
-                item.save()
-
-                remaining_to_withdraw -= deduction
-                
-                affected_items.append({
-                    "item_id": item.id,
-                    "name": item.name,
-                    "deducted": deduction,
-                    "remaining_balance": item.current_balance
-                })
+            # 2. FIFO Strategy: drain items with balance > 0, oldest first
+            affected_items = fifo_withdraw(
+                category.itemsItem.filter(user=request.user), withdraw_amount
+            )
 
         return Response({
             "message": "Withdrawal successful",
@@ -171,29 +156,326 @@ class CategoryViewSet(viewsets.ModelViewSet):
             "items_affected": affected_items
         })
 
+    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
+    def balance(self, request, pk=None):
+        """The caller's balance in this category now, or at ?as_of=<ISO date or datetime>."""
+        category = self.get_object()
+        as_of = timezone.now()
+        value = request.query_params.get('as_of')
+        if value:
+            as_of = parse_datetime(value)
+            if as_of is None and parse_date(value) is not None:
+                # A bare date means the end of that day
+                as_of = datetime.combine(parse_date(value), time.max)
+            if as_of is None:
+                return Response({"error": "as_of must be an ISO date or datetime"}, status=400)
+            if timezone.is_naive(as_of):
+                as_of = timezone.make_aware(as_of)
+
+        return Response({
+            "category": category.id,
+            "as_of": as_of,
+            "balance": Transaction.objects.balance_as_of(request.user, category, as_of),
+        })
+
 
-class ItemViewSet(viewsets.ModelViewSet):
+class ItemViewSet(ConditionalListMixin, ValuesListMixin, CursorPaginationMixin, RelatedQuerysetMixin,
+                   viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = ItemSerializer
+    # ItemSerializer reads category.name and user.username
+    select_related_fields = {'default': ('category', 'user'), 'destroy': ()}
+    last_modified_fields = ('updated_at', 'category__updated_at')
+    values_serializer = ValuesSerializer(ItemSerializer)
+    # ?category=, ?created_after=, ?min_amount=, ?has_balance=... and ?ordering=
+    filter_backends = [ItemFilter, StableOrderingFilter]
+    ordering_fields = ['created_at', 'updated_at', 'amount', 'current_balance', 'name']
+    ordering = ('-created_at', '-id')
+    list_totals = ITEM_TOTALS
     
     def get_queryset(self):
-        return Item.objects.filter(user=self.request.user)
+        return self.with_related(Item.objects.filter(user=self.request.user))
     
     def perform_create(self, serializer):
         # When creating an item, current_balance is handled by the model's save() method
         serializer.save(user=self.request.user)
 
 
-class BudgetViewSet(viewsets.ModelViewSet):
+class BudgetViewSet(ConditionalListMixin, ValuesListMixin, CursorPaginationMixin, RelatedQuerysetMixin,
+                     viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = BudgetSerializer
+    # BudgetSerializer reads category.name and user.username
+    select_related_fields = {'default': ('category', 'user'), 'destroy': ()}
+    last_modified_fields = ('updated_at', 'category__updated_at')
+    values_serializer = ValuesSerializer(BudgetSerializer)
     
     def get_queryset(self):
-        return Budget.objects.filter(user=self.request.user)
+        return self.with_related(Budget.objects.filter(user=self.request.user))
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    @action(detail=False, methods=['get'], url_path='vs-actual')
+    def vs_actual(self, request):
+        # Spend for every budget on the page comes from one grouped query
+        queryset = self.get_queryset().order_by('-created_at', '-id')
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            Budget.attach_spent(page)
+            return self.get_paginated_response(BudgetVsActualSerializer(page, many=True).data)
+        return Response(BudgetVsActualSerializer(Budget.attach_spent(queryset), many=True).data)
+
+
+class ToBuyViewSet(ConditionalListMixin, ValuesListMixin, CursorPaginationMixin, RelatedQuerysetMixin,
+                    viewsets.ModelViewSet):
+    permission_classes = [IsAuthenticated]
+    serializer_class = ToBuySerializer
+    # ToBuySerializer reads category.name and user.username
+    select_related_fields = {'default': ('category', 'user'), 'destroy': ()}
+    last_modified_fields = ('updated_at', 'category__updated_at')
+    values_serializer = ValuesSerializer(ToBuySerializer)
+
+    def get_queryset(self):
+        return self.with_related(ToBuy.objects.filter(user=self.request.user))
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    @action(detail=False, methods=['post'])
+    def purchase(self, request):
+        """Buy the entries in `ids`: withdraw their amounts FIFO from their categories and remove them."""
+        ids = request.data.get('ids')
+        if (not isinstance(ids, list) or not ids
+                or not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in ids)):
+            return Response({"error": "'ids' must be a non-empty list of to-buy ids"}, status=400)
+        if len(ids) > settings.PURCHASE_MAX_ENTRIES:
+            return Response({"error": f"At most {settings.PURCHASE_MAX_ENTRIES} entries per purchase"}, status=400)
+
+        try:
+            entries, withdrawals = purchase(request.user, ids)
+        except ToBuy.DoesNotExist as exc:
+            return Response({"error": "Unknown to-buy entries", "ids": exc.args[0]}, status=404)
+        except InsufficientFunds as exc:
+            return Response({
+                "error": "Insufficient funds",
+                "shortfalls": [
+                    {"category": category_id, "available": available, "requested": requested}
+                    for category_id, (available, requested) in exc.shortfalls.items()
+                ],
+            }, status=400)
+
+        return Response({
+            "message": "Purchase successful",
+            "purchased": [
+                {"id": entry['id'], "name": entry['name'], "category": entry['category_id'],
+                 "amount": entry['amount']}
+                for entry in entries
+            ],
+            "total_amount": sum((entry['amount'] for entry in entries), Decimal('0.00')),
+            "withdrawals": withdrawals,
+        })
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@parser_classes([JSONParser, MultiPartParser])
+def bulk_import(request, kind):
+    """Create many items, budgets or to-buy entries from a JSON array or an uploaded CSV file."""
+    if kind not in IMPORTERS:
+        return Response({'error': f"Unknown import type '{kind}'"}, status=status.HTTP_404_NOT_FOUND)
+
+    if 'file' in request.FILES:
+        rows = csv_rows(request.FILES['file'])
+    elif isinstance(request.data, list):
+        rows = request.data
+    else:
+        return Response(
+            {'error': "Send a JSON array of rows or a CSV upload in the 'file' field"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    report = import_rows(kind, rows, request.user)
+    if report['created'] or not report['errors']:
+        return Response(report, status=status.HTTP_201_CREATED)
+    return Response(report, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_ledger(request, fmt):
+    """Stream all of the user's items, budgets and to-buy entries as CSV or NDJSON."""
+    if fmt not in EXPORT_FORMATS:
+        return Response({'error': f"Unknown export format '{fmt}'"}, status=status.HTTP_404_NOT_FOUND)
+
+    filters = {}
+    for param in ('date_from', 'date_to'):
+        value = request.query_params.get(param)
+        if value:
+            filters[param] = parse_date(value)
+            if filters[param] is None:
+                return Response({'error': f"{param} must be a YYYY-MM-DD date"}, status=400)
+    category = request.query_params.get('category')
+    if category:
+        if not (category.isascii() and category.isdigit()):
+            return Response({'error': "category must be a category id"}, status=400)
+        filters['category'] = int(category)
+
+    stream, content_type = EXPORT_FORMATS[fmt]
+    response = StreamingHttpResponse(
+        stream(ledger_rows(request.user, **filters)), content_type=content_type
+    )
+    response['Content-Disposition'] = f'attachment; filename="ledger.{fmt}"'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def summary(request):
+    """Everything the dashboard shows, in one cached response per user."""
+    etag, data = cached_summary(request.user)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = Response(data)
+    return conditional_headers(response, etag)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def analytics(request, period):
+    """
+    Deposits, withdrawals and net flow per day, week or month and category,
+    read from the maintained rollups. ?start= and ?end= (YYYY-MM-DD) bound the
+    buckets (default: the last year); ?category= narrows to one category.
+    """
+    if period not in dict(FlowRollup.PERIOD_CHOICES):
+        return Response({'error': f"Unknown period '{period}'"}, status=status.HTTP_404_NOT_FOUND)
+
+    bounds = {}
+    for param in ('start', 'end'):
+        value = request.query_params.get(param)
+        if value:
+            bounds[param] = parse_date(value)
+            if bounds[param] is None:
+                return Response({'error': f"{param} must be a YYYY-MM-DD date"}, status=400)
+    end = bounds.get('end') or timezone.localdate()
+    start = bounds.get('start') or end - timedelta(days=365)
+
+    rollups = FlowRollup.objects.filter(
+        user=request.user, period=period, bucket__gte=start, bucket__lte=end
+    ).select_related('category').order_by('bucket', 'category__name')
+    category = request.query_params.get('category')
+    if category:
+        if not (category.isascii() and category.isdigit()):
+            return Response({'error': "category must be a category id"}, status=400)
+        rollups = rollups.filter(category_id=int(category))
+
+    return Response({
+        'period': period,
+        'start': start,
+        'end': end,
+        'buckets': [
+            {
+                'bucket': rollup.bucket,
+                'category': rollup.category_id,
+                'category_name': rollup.category.name,
+                'deposits': rollup.deposits,
+                'withdrawals': rollup.withdrawals,
+                'adjustments': rollup.adjustments,
+                'net': rollup.net,
+            }
+            for rollup in rollups
+        ],
+    })
+
+
+SEARCH_SERIALIZERS = {'item': ItemSerializer, 'budget': BudgetSerializer, 'to_buy': ToBuySerializer}
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search(request):
+    """
+    The caller's items, budgets and to-buy entries whose name or description
+    contain every word of ?q= (the last may be unfinished), best match first. ?type=
+    narrows to a comma-separated list of item, budget and to_buy; ?limit=
+    caps the results (default 20, at most 100).
+    """
+    query = request.query_params.get('q', '')
+    if not search_terms(query):
+        return Response({'error': "q must contain a word to search for"}, status=400)
+    kinds = request.query_params.get('type')
+    kinds = kinds.split(',') if kinds else list(SEARCH_KINDS)
+    if not set(kinds) <= set(SEARCH_KINDS):
+        return Response({'error': f"type must be among {', '.join(SEARCH_KINDS)}"}, status=400)
+    limit = request.query_params.get('limit', '20')
+    if not (limit.isascii() and limit.isdigit()) or not 1 <= int(limit) <= 100:
+        return Response({'error': "limit must be between 1 and 100"}, status=400)
+
+    hits = search_rows(request.user, query, kinds, int(limit))
+    # One query per kind for the rows behind the hits
+    rows = {}
+    for kind in kinds:
+        ids = [pk for hit_kind, pk, _ in hits if hit_kind == kind]
+        if ids:
+            model = SEARCH_KINDS[kind][0]
+            found = model.objects.filter(user=request.user, pk__in=ids).select_related('category', 'user')
+            rows.update(((kind, row.pk), row) for row in found)
+
+    results = [
+        {'type': kind, 'score': score, 'object': SEARCH_SERIALIZERS[kind](rows[kind, pk]).data}
+        for kind, pk, score in hits if (kind, pk) in rows
+    ]
+    return Response({'query': query, 'results': results})
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def batch(request):
+    """
+    Several API calls in one round trip. The body is
+
+        {"requests": [{"method": "GET", "path": "/api/items/?page=2"},
+                      {"method": "POST", "path": "/api/budgets/", "body": {...}}],
+         "atomic": false}
+
+    and the response lists {"status", "headers", "body"} per request, in
+    order. Each one runs as the batch's user, with that view's own
+    permissions; "atomic": true makes the batch all-or-nothing. Login and
+    the async endpoints can't be batched.
+    """
+    entries = request.data.get('requests') if isinstance(request.data, dict) else None
+    error = validate_batch(entries)
+    if error:
+        return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'responses': run_batch(request, entries, atomic=bool(request.data.get('atomic')))})
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def health(request):
+    """
+    Database reachability for anyone; staff also see the connection
+    settings actually in effect.
+    """
+    try:
+        pragmas = connection.applied_pragmas() if hasattr(connection, 'applied_pragmas') else {}
+    except DatabaseError as exc:
+        body = {'status': 'error'}
+        if request.user.is_staff:
+            body['detail'] = str(exc)
+        return Response(body, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    if not request.user.is_staff:
+        return Response({'status': 'ok'})
+    return Response({
+        'status': 'ok',
+        'database': {
+            'vendor': connection.vendor,
+            'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+            'pragmas': pragmas,
+        },
+    })
+
 
 # ==========================================
 # 3. AUTHENTICATION API
@@ -205,7 +487,7 @@ def register_user(request):
     serializer = UserRegistrationSerializer(data=request.data)
     if serializer.is_valid():
         user = serializer.save()
-        refresh = RefreshToken.for_user(user)
+        refresh = ClaimsRefreshToken.for_user(user)
         return Response({
             'message': 'User registered successfully',
             'user': UserSerializer(user).data,
@@ -218,6 +500,7 @@ def register_user(request):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([LoginIPThrottle, LoginUsernameThrottle])
 def login_user(request):
     username = request.data.get('username')
     password = request.data.get('password')
@@ -225,7 +508,7 @@ def login_user(request):
     
     if user is not None:
         login(request, user)
-        refresh = RefreshToken.for_user(user)
+        refresh = ClaimsRefreshToken.for_user(user)
         return Response({
             'message': 'Login successful',
             'user': UserSerializer(user).data,
@@ -239,5 +522,5 @@ def login_user(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_user_profile(request):
-    serializer = UserSerializer(request.user)
+    serializer = UserSerializer(full_user(request.user))
     return Response(serializer.data)
\ No newline at end of file
@@ -0,0 +1,157 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import (
+    Case, DecimalField, ExpressionWrapper, F, Q, Sum, Value, When, Window
+)
+from django.utils import timezone
+
+from .models import CategoryBalance, FlowRollup, Item, ToBuy, Transaction
+from .summary import invalidate_summary
+from .transactions import write_transaction
+
+
+# Deposits are consumed oldest first; `id` breaks ties between deposits created
+# in the same instant so the order is stable between the read and the update.
+FIFO_ORDER = ('created_at', 'id')
+
+
+def fifo_withdraw(deposits, amount):
+    """
+    Deduct `amount` from the `deposits` queryset (Items) oldest first.
+
+    The split is computed with one windowed running-sum query, applied with
+    one UPDATE and journaled with one INSERT ... SELECT, so the number of
+    queries does not depend on how many deposits are drained. Must be called
+    inside a transaction, after checking that the deposits cover `amount`.
+
+    The CategoryBalance ledger and the FlowRollup totals are adjusted for
+    every (user, category) drawn on.
+    Returns the `items_affected` rows in FIFO order.
+    """
+    balance_field = DecimalField(max_digits=15, decimal_places=2)
+
+    # Running total of all balances up to and including each row; a row takes
+    # part in the withdrawal only while the deposits ahead of it don't already
+    # cover the amount.
+    running_total = Window(
+        Sum('current_balance'),
+        order_by=[F(field).asc() for field in FIFO_ORDER],
+        output_field=balance_field,
+    )
+
+    candidates = (
+        deposits.filter(current_balance__gt=0)
+        .annotate(consumed_before=ExpressionWrapper(
+            running_total - F('current_balance'), output_field=balance_field
+        ))
+        .filter(consumed_before__lt=amount)
+        .order_by(*FIFO_ORDER)
+        .values_list('id', 'user_id', 'category_id', 'name', 'created_at', 'current_balance')
+    )
+
+    remaining = amount
+    affected_items = []
+    ledger_deltas = defaultdict(Decimal)
+    for item_id, user_id, category_id, name, created_at, balance in candidates:
+        if remaining <= 0:
+            break
+        deduction = min(balance, remaining)
+        remaining -= deduction
+        ledger_deltas[user_id, category_id] -= deduction
+        affected_items.append({
+            "item_id": item_id,
+            "name": name,
+            "deducted": deduction,
+            "remaining_balance": balance - deduction,
+            "created_at": created_at,
+        })
+
+    if not affected_items:
+        return []
+
+    # Every affected row except possibly the last is drained to zero, so all
+    # of them sit in one contiguous FIFO range ending at the last row.
+    last = affected_items[-1]
+    in_range = Q(created_at__lt=last['created_at']) | Q(
+        created_at=last['created_at'], id__lte=last['item_id']
+    )
+    drained = deposits.filter(in_range, current_balance__gt=0)
+    now = timezone.now()
+    Transaction.objects.record_withdrawal(drained, last['item_id'], last['deducted'], now)
+    drained.update(
+        current_balance=Case(
+            When(pk=last['item_id'], then=Value(last['remaining_balance'])),
+            default=Value(Decimal('0.00')),
+            output_field=balance_field,
+        ),
+        updated_at=now,
+    )
+
+    for (user_id, category_id), delta in ledger_deltas.items():
+        CategoryBalance.objects.adjust(user_id, category_id, delta)
+        FlowRollup.objects.add(user_id, category_id, Transaction.WITHDRAWAL, delta, now)
+        invalidate_summary(user_id)
+
+    for row in affected_items:
+        del row['created_at']
+    return affected_items
+
+
+class InsufficientFunds(Exception):
+    """The deposits don't cover a purchase; `shortfalls` maps category id -> (available, requested)."""
+
+    def __init__(self, shortfalls):
+        super().__init__(shortfalls)
+        self.shortfalls = shortfalls
+
+
+def purchase(user, to_buy_ids):
+    """
+    Buy `user`'s to-buy entries `to_buy_ids`, all or nothing, in one write
+    transaction: withdraw each entry's amount from its category FIFO, then
+    delete the entries.
+
+    The balances of every category involved are checked (and locked) with
+    one query, and entries in the same category share one withdrawal.
+    Raises ToBuy.DoesNotExist with the unknown ids, or InsufficientFunds.
+    Returns (entries, withdrawals): the bought entries as dicts, and one
+    withdrawal per category like CategoryViewSet.withdraw's response.
+    """
+    ids = set(to_buy_ids)
+    with write_transaction():
+        entries = list(
+            ToBuy.objects.select_for_update().filter(user=user, pk__in=ids)
+            .order_by('created_at', 'id').values('id', 'name', 'category_id', 'amount')
+        )
+        missing = ids - {entry['id'] for entry in entries}
+        if missing:
+            raise ToBuy.DoesNotExist(sorted(missing))
+
+        requested = defaultdict(Decimal)
+        for entry in entries:
+            requested[entry['category_id']] += entry['amount']
+
+        available = dict(
+            CategoryBalance.objects.select_for_update()
+            .filter(user=user, category_id__in=requested)
+            .values_list('category_id', 'balance')
+        )
+        shortfalls = {
+            category_id: (available.get(category_id, Decimal('0.00')), amount)
+            for category_id, amount in requested.items()
+            if amount > available.get(category_id, Decimal('0.00'))
+        }
+        if shortfalls:
+            raise InsufficientFunds(shortfalls)
+
+        withdrawals = []
+        for category_id, amount in requested.items():
+            withdrawals.append({
+                "category": category_id,
+                "withdrawn_amount": amount,
+                "new_category_balance": available[category_id] - amount,
+                "items_affected": fifo_withdraw(Item.objects.filter(user=user, category_id=category_id), amount),
+            })
+        ToBuy.objects.filter(pk__in=ids).delete()
+    return entries, withdrawals
@@ -37,6 +37,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'finances.middleware.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'finmanapp.urls'
@@ -59,13 +60,67 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'finmanapp.wsgi.application'
 
+# finmanapp.sqlite is the stock backend plus per-connection PRAGMAs: WAL so
+# reads don't block the writer, and a busy timeout so concurrent writers
+# queue for the lock instead of failing with "database is locked".
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'finmanapp.sqlite',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Seconds a connection is reused across requests (0 closes it after each)
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=600, cast=int),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'pragmas': {
+                'journal_mode': config('SQLITE_JOURNAL_MODE', default='wal'),
+                'synchronous': config('SQLITE_SYNCHRONOUS', default='normal'),
+                'busy_timeout': config('SQLITE_BUSY_TIMEOUT', default=5000, cast=int),
+                'mmap_size': config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int),
+                # Negative is KiB rather than pages
+                'cache_size': config('SQLITE_CACHE_SIZE', default=-64000, cast=int),
+            },
+        },
+    }
+}
+
+# Set READ_REPLICA_NAME to a second database file to serve reads of GET
+# requests from it (see finances.routers). Locally, copy the primary into it
+# with `manage.py sync_replica`. Needs a shared CACHE_BACKEND, which holds the
+# flags keeping users who just wrote on the primary.
+if config('READ_REPLICA_NAME', default=''):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': config('READ_REPLICA_NAME'),
+        'OPTIONS': {
+            'pragmas': {**DATABASES['default']['OPTIONS']['pragmas'], 'query_only': 1},
+        },
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['finances.routers.ReplicaRouter']
+
+# Seconds a user's reads stay on the primary after a write, to cover replica lag
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=10, cast=int)
+
+# Local memory is per process; point CACHE_BACKEND at
+# django.core.cache.backends.filebased.FileBasedCache (with CACHE_LOCATION a
+# directory) so invalidations reach every gunicorn worker.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='finmanapp'),
     }
 }
 
+# Sub-requests accepted by one /api/batch/ call
+BATCH_MAX_REQUESTS = config('BATCH_MAX_REQUESTS', default=20, cast=int)
+
+# To-buy entries accepted by one /api/to-buy/purchase/ call
+PURCHASE_MAX_ENTRIES = config('PURCHASE_MAX_ENTRIES', default=100, cast=int)
+
+# Seconds a user's cached /api/summary/ may be served before it is rebuilt
+SUMMARY_CACHE_TIMEOUT = config('SUMMARY_CACHE_TIMEOUT', default=300, cast=int)
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -73,6 +128,14 @@ AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator'},
 ]
 
+# Passwords are verified in finances.hashing's process pool
+AUTHENTICATION_BACKENDS = ['finances.authentication.PooledModelBackend']
+# Hashing processes per server process (0 hashes inline), and the most
+# hashes running or waiting at once before sign-ins are answered with 429;
+# keep the latter below the number of request workers
+PASSWORD_HASH_WORKERS = config('PASSWORD_HASH_WORKERS', default=1, cast=int)
+PASSWORD_HASH_QUEUE = config('PASSWORD_HASH_QUEUE', default=2, cast=int)
+
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
 USE_I18N = True
@@ -95,14 +158,26 @@ CORS_ALLOW_CREDENTIALS = True
 
 # REST Framework settings
 REST_FRAMEWORK = {
+    # finances.authentication.StatelessJWTAuthentication skips the per-request
+    # user query by trusting the token's claims; it needs a shared CACHE_BACKEND
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        config('JWT_AUTHENTICATION_CLASS', default='rest_framework_simplejwt.authentication.JWTAuthentication'),
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
+    # Same bytes as DRF's JSONRenderer, encoded with orjson
+    'DEFAULT_RENDERER_CLASSES': [
+        'finances.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
-    'PAGE_SIZE': 10
+    'PAGE_SIZE': 10,
+    # Login attempts, counted in the cache (see finances.throttles)
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': config('LOGIN_IP_RATE', default='30/min'),
+        'login_username': config('LOGIN_USERNAME_RATE', default='10/min'),
+    },
 }
 
 SIMPLE_JWT = {
@@ -111,4 +186,9 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
     'AUTH_HEADER_TYPES': ('Bearer',),
-}
\ No newline at end of file
+    'TOKEN_REFRESH_SERIALIZER': 'finances.authentication.RevocationAwareRefreshSerializer',
+}
+
+# Full user rows kept per process for stateless-authenticated views that need them
+AUTH_USER_CACHE_SIZE = config('AUTH_USER_CACHE_SIZE', default=1024, cast=int)
+AUTH_USER_CACHE_TIMEOUT = config('AUTH_USER_CACHE_TIMEOUT', default=60, cast=int)
\ No newline at end of file
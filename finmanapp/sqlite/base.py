@@ -0,0 +1,46 @@
+"""
+SQLite backend that applies the PRAGMAs in OPTIONS['pragmas'] to every new
+connection, e.g. WAL journaling so readers don't block the writer and a
+busy timeout so a second writer waits for the lock instead of failing with
+"database is locked".
+"""
+import re
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+# PRAGMA takes no bound parameters, so names and values are checked here
+PRAGMA_NAME = re.compile(r'^[a-z_]+$')
+PRAGMA_VALUE = re.compile(r'^(-?\d+|[A-Za-z_]+)$')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pragmas', None)
+        return params
+
+    @property
+    def pragmas(self):
+        pragmas = self.settings_dict['OPTIONS'].get('pragmas', {})
+        for name, value in pragmas.items():
+            if not PRAGMA_NAME.match(name) or not PRAGMA_VALUE.match(str(value)):
+                raise ImproperlyConfigured(f'Invalid SQLite pragma {name}={value!r}')
+        return pragmas
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def applied_pragmas(self):
+        """The value SQLite reports for each configured pragma on this connection."""
+        with self.cursor() as cursor:
+            applied = {}
+            for name in self.pragmas:
+                cursor.execute(f'PRAGMA {name}')
+                # In-memory databases report nothing for some, e.g. mmap_size
+                row = cursor.fetchone()
+                applied[name] = row[0] if row else None
+        return applied
@@ -14,5 +14,4 @@ urlpatterns = [
     path('login/', views.login_view, name='login'),
     path('register/', views.register_view, name='register'),
     path('to-buy/', views.to_buy_view, name='to-buy'),
-    path('to-buy/delete/<int:pk>/', views.delete_to_buy, name='delete-to-buy'),
 ]
\ No newline at end of file